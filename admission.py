@@ -0,0 +1,172 @@
+# admission.py
+"""Load shedding: per-route-group concurrency limits with a bounded, deadline
+wait queue, and per-user token-bucket rate limits."""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Annotated
+from fastapi import Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+from cache import TTLCache
+from config import settings
+from metrics import (
+    ADMISSION_ACTIVE,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT_SECONDS,
+    RATE_LIMITED,
+)
+from security import CurrentUser, get_current_user
+
+
+class ConcurrencyLimiter:
+    """At most `limit` holders; up to `queue_size` callers wait in FIFO order
+    for `timeout` seconds. A released slot is handed straight to the next
+    waiter so late arrivals can't jump the queue."""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> str | None:
+        """Returns None once a slot is held, else the rejection reason."""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+
+        if len(self._waiters) >= self.queue_size:
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+            return None
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived as we gave up: pass it on.
+                self.release()
+            elif waiter in self._waiters:
+                # wait_for cancelled it; release() may already have skipped it.
+                self._waiters.remove(waiter)
+
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return "timeout"
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.active -= 1
+
+
+def route_group(path: str, groups) -> str | None:
+    """The longest prefix in ``groups`` that ``path`` falls under."""
+    matches = [
+        prefix for prefix in groups if path == prefix or path.startswith(prefix + "/")
+    ]
+    return max(matches, key=len, default=None)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, limits: dict[str, int] | None = None):
+        self.app = app
+        self.limiters = {
+            group: ConcurrencyLimiter(
+                limit,
+                settings.admission_queue_size,
+                settings.admission_timeout_seconds,
+            )
+            for group, limit in (
+                settings.admission_limits if limits is None else limits
+            ).items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        group = None
+        if scope["type"] == "http":
+            group = route_group(scope["path"], self.limiters)
+
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[group]
+        started = time.perf_counter()
+        rejected = await limiter.acquire()
+        ADMISSION_WAIT_SECONDS.labels(group).observe(time.perf_counter() - started)
+
+        if rejected is not None:
+            ADMISSION_REJECTED.labels(group, rejected).inc()
+            response = JSONResponse(
+                {"detail": "Server is busy, try again shortly"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(settings.admission_retry_after_seconds)},
+            )
+            await response(scope, receive, send)
+            return
+
+        ADMISSION_ACTIVE.labels(group).inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ADMISSION_ACTIVE.labels(group).dec()
+            limiter.release()
+
+
+class TokenBucket:
+    """Per-key token buckets. A full bucket is the same as no entry, so each
+    entry expires once it would have refilled and the LRU bound caps memory."""
+
+    def __init__(self, rate: float, burst: int, maxsize: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._buckets = TTLCache(maxsize=maxsize, clock=clock)
+
+    def take(self, key) -> float:
+        """Spends one token. Returns 0 on success, else seconds until one
+        is available."""
+        now = self._clock()
+        tokens, updated = self._buckets.get(key) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens < 1:
+            return (1 - tokens) / self.rate
+
+        tokens -= 1
+        self._buckets.set(
+            key, (tokens, now), expires_at=now + (self.burst - tokens) / self.rate
+        )
+        return 0.0
+
+
+rate_limiter = TokenBucket(
+    rate=settings.rate_limit_per_second,
+    burst=settings.rate_limit_burst,
+    maxsize=settings.token_cache_size,
+)
+
+
+async def enforce_rate_limit(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+) -> None:
+    if rate_limiter.rate <= 0:
+        return
+
+    retry_after = rate_limiter.take(current_user.id)
+    if retry_after:
+        RATE_LIMITED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
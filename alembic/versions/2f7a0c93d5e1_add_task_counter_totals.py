@@ -0,0 +1,46 @@
+"""add-task-counter-totals
+
+Revision ID: 2f7a0c93d5e1
+Revises: c5a19f0e6b82
+Create Date: 2026-10-18 16:22:13.448090
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f7a0c93d5e1'
+down_revision: Union[str, Sequence[str], None] = 'c5a19f0e6b82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('task_counters') as batch_op:
+        batch_op.add_column(sa.Column('total', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('completed', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the tasks that already exist.
+    op.execute(
+        "INSERT INTO task_counters (user_id, revision, total, completed) "
+        "SELECT DISTINCT user_id, 0, 0, 0 FROM tasks "
+        "WHERE user_id NOT IN (SELECT user_id FROM task_counters)"
+    )
+    op.execute(
+        "UPDATE task_counters SET "
+        "total = (SELECT count(*) FROM tasks "
+        "WHERE tasks.user_id = task_counters.user_id), "
+        "completed = (SELECT count(*) FROM tasks "
+        "WHERE tasks.user_id = task_counters.user_id AND tasks.is_completed)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('task_counters') as batch_op:
+        batch_op.drop_column('completed')
+        batch_op.drop_column('total')
@@ -0,0 +1,30 @@
+"""add-tasks-user-id-index
+
+Revision ID: 3b9c2e7d41a0
+Revises: fd00f8081abc
+Create Date: 2026-10-18 09:12:04.311528
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9c2e7d41a0'
+down_revision: Union[str, Sequence[str], None] = 'fd00f8081abc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keyset pagination walks (user_id, id); the model declared this index
+    # but the initial migration never created it.
+    op.create_index(op.f('ix_tasks_user_id'), 'tasks', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tasks_user_id'), table_name='tasks')
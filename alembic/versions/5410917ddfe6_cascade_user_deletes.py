@@ -0,0 +1,71 @@
+"""cascade-user-deletes
+
+Revision ID: 5410917ddfe6
+Revises: 2f7a0c93d5e1
+Create Date: 2026-10-18 14:13:00.676528
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5410917ddfe6'
+down_revision: Union[str, Sequence[str], None] = '2f7a0c93d5e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The original foreign keys are unnamed; batch mode names the reflected ones
+# by this convention so they can be dropped and recreated.
+NAMING_CONVENTION = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+)
+
+
+def replace_user_fk(table_name: str, ondelete: str | None) -> None:
+    with op.batch_alter_table(table_name, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(f'fk_{table_name}_user_id_users', type_='foreignkey')
+        batch_op.create_foreign_key(
+            f'fk_{table_name}_user_id_users', 'users', ['user_id'], ['id'], ondelete=ondelete
+        )
+
+
+def restore_fts_triggers() -> None:
+    # On SQLite batch mode rebuilds tasks, which drops its triggers. Row ids
+    # are copied unchanged, so the tasks_fts index itself stays valid.
+    if op.get_context().dialect.name == 'sqlite':
+        for statement in FTS_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    replace_user_fk('task_counters', 'CASCADE')
+    replace_user_fk('tasks', 'CASCADE')
+    restore_fts_triggers()
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('deleted_at')
+
+    replace_user_fk('tasks', None)
+    restore_fts_triggers()
+    replace_user_fk('task_counters', None)
@@ -0,0 +1,53 @@
+"""add-task-versions-and-tombstones
+
+Revision ID: 785b3275a7cb
+Revises: 5410917ddfe6
+Create Date: 2026-10-18 14:46:16.687291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '785b3275a7cb'
+down_revision: Union[str, Sequence[str], None] = '5410917ddfe6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_tombstones',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_tombstones_user_id_version', 'task_tombstones', ['user_id', 'version'], unique=False)
+    # A plain ADD COLUMN: no batch rebuild, so the FTS triggers on tasks stay.
+    op.add_column('tasks', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_tasks_user_id_version', 'tasks', ['user_id', 'version'], unique=False)
+
+    # Existing tasks get a fresh revision of their own, above 0, so a first
+    # sync (since=0) returns them.
+    op.execute(
+        "UPDATE task_counters SET revision = revision + 1 "
+        "WHERE user_id IN (SELECT user_id FROM tasks)"
+    )
+    op.execute(
+        "UPDATE tasks SET version = (SELECT revision FROM task_counters "
+        "WHERE task_counters.user_id = tasks.user_id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_user_id_version', table_name='tasks')
+    op.drop_column('tasks', 'version')
+    op.drop_index('ix_task_tombstones_user_id_version', table_name='task_tombstones')
+    op.drop_table('task_tombstones')
@@ -0,0 +1,33 @@
+"""add-task-counters
+
+Revision ID: 8e41d6a2c7f3
+Revises: 3b9c2e7d41a0
+Create Date: 2026-10-18 11:40:27.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41d6a2c7f3'
+down_revision: Union[str, Sequence[str], None] = '3b9c2e7d41a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('task_counters')
@@ -0,0 +1,54 @@
+"""add-task-filter-index-and-fts
+
+Revision ID: c5a19f0e6b82
+Revises: 8e41d6a2c7f3
+Create Date: 2026-10-18 14:05:51.620347
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a19f0e6b82'
+down_revision: Union[str, Sequence[str], None] = '8e41d6a2c7f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts "
+    "USING fts5(title, content='tasks', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+    # Index the rows that already exist.
+    "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_user_completed_id', 'tasks', ['user_id', 'is_completed', 'id'], unique=False)
+
+    if op.get_context().dialect.name == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'sqlite':
+        for name in ('tasks_fts_ai', 'tasks_fts_ad', 'tasks_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS tasks_fts")
+
+    op.drop_index('ix_tasks_user_completed_id', table_name='tasks')
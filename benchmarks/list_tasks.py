@@ -0,0 +1,111 @@
+# benchmarks/list_tasks.py
+"""Serialization cost of one large task list: the ORM + response_model path
+versus column projection encoded straight to JSON.
+
+    python -m benchmarks.list_tasks --tasks 10000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+# Settings has no defaults for these; the benchmark never issues tokens.
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRES_MINUTES", "30")
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import Base, build_engine
+from projection import columns_for, rows_to_dicts
+from schemas import Page, TaskOut
+import models
+
+page_adapter = TypeAdapter(Page[TaskOut])
+
+
+async def orm_response_model(session) -> bytes:
+    result = await session.execute(
+        select(models.Task).where(models.Task.user_id == 1).order_by(models.Task.id)
+    )
+    tasks = result.scalars().all()
+
+    # What FastAPI does with a response_model: validate, dump, json.dumps.
+    page = page_adapter.validate_python(
+        {"items": tasks, "next_cursor": None}, from_attributes=True
+    )
+    return json.dumps(page_adapter.dump_python(page, mode="json")).encode()
+
+
+async def projected_orjson(session) -> bytes:
+    result = await session.execute(
+        select(*columns_for(models.Task, TaskOut))
+        .where(models.Task.user_id == 1)
+        .order_by(models.Task.id)
+    )
+    return orjson.dumps({"items": rows_to_dicts(result.all()), "next_cursor": None})
+
+
+async def run(task_count: int, repeat: int) -> dict:
+    engine = build_engine("sqlite+aiosqlite:///:memory:")
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(models.User),
+            [{"id": 1, "username": "bench", "email": "b@x.io", "hashed_password": "-"}],
+        )
+        await conn.execute(
+            insert(models.Task),
+            [
+                {"title": f"Task {i}", "is_completed": i % 3 == 0, "user_id": 1}
+                for i in range(task_count)
+            ],
+        )
+
+    report = {"tasks": task_count, "repeat": repeat}
+
+    for strategy in (orm_response_model, projected_orjson):
+        timings = []
+        for _ in range(repeat):
+            # Fresh session each time, as a request would get.
+            async with sessions() as session:
+                started = time.perf_counter()
+                body = await strategy(session)
+                timings.append(time.perf_counter() - started)
+
+        report[strategy.__name__] = {
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+            "bytes": len(body),
+        }
+
+    await engine.dispose()
+
+    report["speedup"] = round(
+        report["orm_response_model"]["median_ms"]
+        / report["projected_orjson"]["median_ms"],
+        2,
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.tasks, args.repeat)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+# benchmarks/load.py
+"""Load benchmark for every route in main.app.
+
+Seeds a throwaway SQLite file with N users x M tasks, drives the app
+in-process through httpx's ASGI transport with concurrent async clients, and
+reports requests/sec and p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.load --users 50 --tasks 200 --requests 500 \\
+        --concurrency 32 --output benchmarks/results/baseline.json
+    python -m benchmarks.load --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+PASSWORD = "benchmark-password"
+
+
+@dataclass
+class BenchState:
+    users: int
+    tasks_per_user: int
+    tokens: list[str] = field(default_factory=list)
+    user_ids: list[int] = field(default_factory=list)
+    task_ids: list[list[int]] = field(default_factory=list)
+    registered_ids: list[int] = field(default_factory=list)
+
+    def auth(self, i: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[i % self.users]}"}
+
+    def task_id(self, i: int) -> int:
+        # Walks users first, so request i touches a task no earlier i did.
+        return self.task_ids[i % self.users][i // self.users]
+
+
+async def register(client, state, i):
+    response = await client.post(
+        "/auth/register",
+        json={
+            "username": f"bench-new-{i}",
+            "email": f"bench-new-{i}@example.com",
+            "password": PASSWORD,
+        },
+    )
+    if response.status_code == 201:
+        state.registered_ids.append(response.json()["id"])
+    return response
+
+
+async def login(client, state, i):
+    return await client.post(
+        "/auth/login",
+        data={"username": f"bench-{i % state.users}", "password": PASSWORD},
+    )
+
+
+async def list_tasks(client, state, i):
+    return await client.get("/tasks", headers=state.auth(i))
+
+
+async def filter_tasks(client, state, i):
+    return await client.get(
+        "/tasks", params={"is_completed": "false", "q": "task"}, headers=state.auth(i)
+    )
+
+
+async def task_stats(client, state, i):
+    return await client.get("/tasks/stats", headers=state.auth(i))
+
+
+async def export_tasks(client, state, i):
+    return await client.get("/tasks/export", headers=state.auth(i))
+
+
+async def task_changes(client, state, i):
+    # Seeded tasks carry version 0, so this is a reconnecting client fetching
+    # only what the other scenarios changed.
+    return await client.get(
+        "/tasks/changes", params={"since": 0}, headers=state.auth(i)
+    )
+
+
+async def create_task(client, state, i):
+    return await client.post(
+        "/tasks", json={"title": f"Created {i}"}, headers=state.auth(i)
+    )
+
+
+async def create_tasks_bulk(client, state, i):
+    return await client.post(
+        "/tasks/bulk",
+        json=[{"title": f"Bulk {i}-{n}"} for n in range(10)],
+        headers=state.auth(i),
+    )
+
+
+async def update_task(client, state, i):
+    return await client.patch(
+        f"/tasks/{state.task_id(i)}",
+        json={"is_completed": True},
+        headers=state.auth(i),
+    )
+
+
+async def update_tasks_bulk(client, state, i):
+    return await client.patch(
+        "/tasks/bulk",
+        json=[{"id": state.task_id(i), "title": f"Renamed {i}"}],
+        headers=state.auth(i),
+    )
+
+
+async def delete_task(client, state, i):
+    return await client.delete(f"/tasks/{state.task_id(i)}", headers=state.auth(i))
+
+
+async def delete_tasks_bulk(client, state, i):
+    # Offset past the tasks delete_task consumed.
+    offset = i + state.users * (state.tasks_per_user // 2)
+    return await client.request(
+        "DELETE",
+        "/tasks/bulk",
+        json={"ids": [state.task_id(offset)]},
+        headers=state.auth(i),
+    )
+
+
+async def list_users(client, state, i):
+    return await client.get("/users")
+
+
+async def list_users_with_counts(client, state, i):
+    return await client.get("/users", params={"include": "task_counts"})
+
+
+async def get_users_batch(client, state, i):
+    ids = ",".join(str(state.user_ids[(i + n) % state.users]) for n in range(20))
+    return await client.get("/users/batch", params={"ids": ids})
+
+
+async def get_user(client, state, i):
+    return await client.get(f"/users/{state.user_ids[i % state.users]}")
+
+
+async def delete_user(client, state, i):
+    if i >= len(state.registered_ids):
+        return None
+    return await client.delete(f"/users/{state.registered_ids[i]}")
+
+
+async def root(client, state, i):
+    return await client.get("/")
+
+
+async def health(client, state, i):
+    return await client.get("/health")
+
+
+async def health_cache(client, state, i):
+    return await client.get("/health/cache")
+
+
+# Ordered so destructive scenarios run after the ones that read their data.
+SCENARIOS = {
+    "POST /auth/register": register,
+    "POST /auth/login": login,
+    "GET /tasks": list_tasks,
+    "GET /tasks?filtered": filter_tasks,
+    "GET /tasks/stats": task_stats,
+    "GET /tasks/export": export_tasks,
+    "GET /tasks/changes": task_changes,
+    "POST /tasks": create_task,
+    "POST /tasks/bulk": create_tasks_bulk,
+    "PATCH /tasks/{task_id}": update_task,
+    "PATCH /tasks/bulk": update_tasks_bulk,
+    "DELETE /tasks/{task_id}": delete_task,
+    "DELETE /tasks/bulk": delete_tasks_bulk,
+    "GET /users": list_users,
+    "GET /users?include=task_counts": list_users_with_counts,
+    "GET /users/batch": get_users_batch,
+    "GET /users/{user_id}": get_user,
+    "DELETE /users/{user_id}": delete_user,
+    "GET /": root,
+    "GET /health": health,
+    "GET /health/cache": health_cache,
+}
+
+
+def uncovered_routes(app) -> list[str]:
+    from fastapi.routing import APIRoute
+
+    covered = {name.split("?")[0] for name in SCENARIOS}
+    return sorted(
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+        if f"{method} {route.path}" not in covered
+    )
+
+
+async def seed(state: BenchState) -> None:
+    from sqlalchemy import insert, select
+    from database import Base, init_engines
+    from security import _hash, create_access_token
+    import database
+    import models
+
+    init_engines()
+    SessionLocal = database.SessionLocal
+
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # One Argon2 hash shared by every seeded user keeps seeding fast.
+    hashed_password = _hash(PASSWORD)
+
+    async with SessionLocal() as db:
+        result = await db.scalars(
+            insert(models.User).returning(models.User.id, sort_by_parameter_order=True),
+            [
+                {
+                    "username": f"bench-{n}",
+                    "email": f"bench-{n}@example.com",
+                    "hashed_password": hashed_password,
+                }
+                for n in range(state.users)
+            ],
+        )
+        state.user_ids = list(result)
+        await db.commit()
+
+    # Tasks go through the app's own bulk path so counters and shards match.
+    from routers.task import record_task_changes
+    from database import task_sessionmaker
+
+    for n, user_id in enumerate(state.user_ids):
+        sessionmaker = task_sessionmaker(user_id) or SessionLocal
+        async with sessionmaker() as db:
+            await db.execute(
+                insert(models.Task),
+                [
+                    {"title": f"Seeded task {t}", "user_id": user_id}
+                    for t in range(state.tasks_per_user)
+                ],
+            )
+            await record_task_changes(db, user_id, total=state.tasks_per_user)
+            await db.commit()
+
+            result = await db.scalars(
+                select(models.Task.id)
+                .where(models.Task.user_id == user_id)
+                .order_by(models.Task.id)
+            )
+            state.task_ids.append(list(result))
+
+        state.tokens.append(create_access_token({"sub": f"bench-{n}"}))
+
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+async def run_scenario(client, state, scenario, requests: int, concurrency: int):
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    indices = iter(range(requests))
+
+    async def worker():
+        for i in indices:
+            started = time.perf_counter()
+            response = await scenario(client, state, i)
+            if response is None:
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    import httpx
+    from database import dispose_engines
+    from main import app
+    from security import shutdown_hash_executor
+
+    state = BenchState(users=args.users, tasks_per_user=args.tasks)
+    await seed(state)
+
+    # Mutating scenarios each consume one seeded task per request.
+    requests = min(args.requests, args.users * (args.tasks // 2))
+    selected = {
+        name: scenario
+        for name, scenario in SCENARIOS.items()
+        if not args.only or any(part in name for part in args.only)
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for name, scenario in selected.items():
+            results[name] = await run_scenario(
+                client, state, scenario, requests, args.concurrency
+            )
+            print(
+                f"{name:<28} {results[name]['rps']:>9.1f} req/s  "
+                f"p50 {results[name]['p50_ms']:>8.2f}  "
+                f"p95 {results[name]['p95_ms']:>8.2f}  "
+                f"p99 {results[name]['p99_ms']:>8.2f} ms  "
+                f"errors {results[name]['errors']}",
+                file=sys.stderr,
+            )
+
+    missing = uncovered_routes(app)
+    shutdown_hash_executor()
+    await dispose_engines()
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "users": args.users,
+            "tasks_per_user": args.tasks,
+            "requests": requests,
+            "concurrency": args.concurrency,
+            "uncovered_routes": missing,
+        },
+        "endpoints": results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    shape = ("users", "tasks_per_user", "requests", "concurrency")
+    if any(baseline["meta"].get(key) != current["meta"][key] for key in shape):
+        print("warning: baseline was run with a different dataset or load shape")
+
+    print(f"\n{'endpoint':<28} {'req/s':>18} {'p95 ms':>20}")
+    for name, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            continue
+
+        def delta(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(
+            f"{name:<28} {now['rps']:>9.1f} {delta(now['rps'], before['rps']):>8} "
+            f"{now['p95_ms']:>11.2f} {delta(now['p95_ms'], before['p95_ms']):>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=100, help="tasks per user")
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="substring filter on endpoints")
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--compare", type=Path, help="baseline JSON to diff against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Always a throwaway database, never the one from .env.
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/bench.db"
+        os.environ.pop("TASK_SHARD_URLS", None)
+        os.environ.setdefault("SECRET_KEY", "benchmark")
+        os.environ.setdefault("ALGORITHM", "HS256")
+        os.environ.setdefault("ACCESS_TOKEN_EXPIRES_MINUTES", "30")
+
+        report = asyncio.run(run(args))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+    if report["meta"]["uncovered_routes"]:
+        print(
+            "routes without a scenario: "
+            + ", ".join(report["meta"]["uncovered_routes"]),
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/startup.py
+"""Cold start: import-to-first-response time of the API.
+
+Each run is a fresh interpreter that imports main, builds the app, runs the
+lifespan startup (engines, Argon2, warm connections, optional OpenAPI) and
+serves one request through httpx's ASGI transport.
+
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --path /openapi.json --precompute-openapi
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PHASES = ("import_main", "create_app", "lifespan_startup", "first_response")
+
+
+def child(path: str) -> None:
+    import asyncio
+
+    marks = [time.perf_counter()]
+    import main
+
+    marks.append(time.perf_counter())
+    app = main.app
+    marks.append(time.perf_counter())
+
+    async def first_request():
+        import httpx
+
+        async with app.router.lifespan_context(app):
+            marks.append(time.perf_counter())
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                response = await client.get(path)
+            marks.append(time.perf_counter())
+            response.raise_for_status()
+
+    asyncio.run(first_request())
+
+    print(
+        json.dumps(
+            {
+                phase: (end - start) * 1000
+                for phase, start, end in zip(PHASES, marks, marks[1:])
+            }
+        )
+    )
+
+
+def run(args) -> dict:
+    samples = {phase: [] for phase in (*PHASES, "process_total")}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            # Always a throwaway database, never the one from .env.
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/startup.db",
+            "OPENAPI_PRECOMPUTE": str(args.precompute_openapi).lower(),
+        }
+        env.pop("TASK_SHARD_URLS", None)
+        env.setdefault("SECRET_KEY", "benchmark")
+        env.setdefault("ALGORITHM", "HS256")
+        env.setdefault("ACCESS_TOKEN_EXPIRES_MINUTES", "30")
+
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--child", args.path],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            samples["process_total"].append((time.perf_counter() - started) * 1000)
+
+            for phase, ms in json.loads(output.splitlines()[-1]).items():
+                samples[phase].append(ms)
+
+    return {
+        "runs": args.runs,
+        "path": args.path,
+        "precompute_openapi": args.precompute_openapi,
+        "median_ms": {
+            phase: round(statistics.median(values), 2)
+            for phase, values in samples.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health", help="first request")
+    parser.add_argument("--precompute-openapi", action="store_true")
+    parser.add_argument("--child", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
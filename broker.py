@@ -0,0 +1,151 @@
+# broker.py
+"""Pub/sub for task change events, consumed by the SSE stream.
+
+Events are published per user once the write has committed and handed to a
+backend, which delivers them to every worker's broker. The default backend
+delivers in-process. Several uvicorn workers need a backend built on shared
+pub/sub (Redis, PostgreSQL LISTEN/NOTIFY) with the same interface:
+`publish(channel, event)`, plus `start(deliver)` / `stop()` for a listener
+that calls `deliver` on each worker; set it as `broker.backend`.
+
+Event ids are the user's task revision (see record_task_changes), so a
+reconnecting client's Last-Event-ID tells us exactly which events it missed.
+"""
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable
+import orjson
+from cache import TTLCache
+from config import settings
+from metrics import SSE_DROPPED, SSE_SUBSCRIBERS
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: Any = None
+
+    def encode(self) -> bytes:
+        return (
+            f"id: {self.id}\nevent: {self.type}\ndata: ".encode()
+            + orjson.dumps(self.data)
+            + b"\n\n"
+        )
+
+
+class Subscription:
+    def __init__(self, channel: int, maxsize: int):
+        self.channel = channel
+        self.queue: asyncio.Queue[Event | None] = asyncio.Queue(maxsize)
+
+    def put(self, event: Event) -> bool:
+        """Queue ``event``; False (and the stream is told to end) when the
+        subscriber has fallen too far behind."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # A slow client doesn't get to grow memory without bound. Ending
+            # the stream makes its EventSource reconnect with Last-Event-ID
+            # and resume from the replay buffer instead.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    async def get(self, timeout: float) -> Event | None:
+        """Next event; raises asyncio.TimeoutError after ``timeout`` seconds
+        and returns None once the subscription has been dropped."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalBackend:
+    """Delivers to this process only."""
+
+    def __init__(self, deliver: Callable[[int, Event], None]):
+        self.deliver = deliver
+
+    async def start(self, deliver: Callable[[int, Event], None]) -> None:
+        self.deliver = deliver
+
+    async def stop(self) -> None:
+        pass
+
+    def publish(self, channel: int, event: Event) -> None:
+        self.deliver(channel, event)
+
+
+class Broker:
+    def __init__(self, backend=None, clock: Callable[[], float] = time.time):
+        self.backend = LocalBackend(self.deliver) if backend is None else backend
+        self.subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self._clock = clock
+        self._history: TTLCache | None = None
+
+    @property
+    def history(self) -> TTLCache:
+        # Sized from settings on first use, not at import.
+        if self._history is None:
+            self._history = TTLCache(settings.sse_replay_users, clock=self._clock)
+        return self._history
+
+    async def start(self) -> None:
+        await self.backend.start(self.deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+
+    def publish(self, channel: int, event: Event) -> None:
+        self.backend.publish(channel, event)
+
+    def deliver(self, channel: int, event: Event) -> None:
+        """Called by the backend, on every worker, for every event."""
+        recent = self.history.get(channel)
+        if recent is None:
+            recent = deque(maxlen=settings.sse_replay_size)
+        recent.append(event)
+        self.history.set(
+            channel, recent, self._clock() + settings.sse_replay_ttl_seconds
+        )
+
+        for subscription in list(self.subscriptions.get(channel, ())):
+            if not subscription.put(event):
+                SSE_DROPPED.inc()
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channel: int) -> Subscription:
+        subscription = Subscription(channel, settings.sse_queue_size)
+        self.subscriptions[channel].add(subscription)
+        SSE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscriptions.get(subscription.channel)
+        if subscribers is None or subscription not in subscribers:
+            return
+
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscriptions[subscription.channel]
+        SSE_SUBSCRIBERS.dec()
+
+    def replay(self, channel: int, after: int, upto: int) -> list[Event] | None:
+        """Events ``after`` < id <= ``upto`` in order, or None if any of them
+        is no longer (or was never) in this worker's replay buffer."""
+        if upto <= after:
+            return []
+
+        recent = self.history.get(channel) or ()
+        missed = {event.id: event for event in recent if after < event.id <= upto}
+
+        if len(missed) != upto - after:
+            return None
+
+        return [missed[event_id] for event_id in sorted(missed)]
+
+
+broker = Broker()
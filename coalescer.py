@@ -0,0 +1,141 @@
+# coalescer.py
+"""Group commit for task writes.
+
+With WRITE_COALESCING on, concurrent task mutations are queued for up to
+WRITE_COALESCE_WINDOW_MS (or until WRITE_COALESCE_MAX_BATCH are waiting) and
+applied in one transaction: one writer-lock acquisition and one fsync for the
+whole batch. Each operation runs in its own SAVEPOINT, so a failing one (a
+404, a constraint error) is rolled back alone and only its caller sees the
+error; everyone else gets their result once the shared COMMIT lands.
+"""
+
+import asyncio
+import contextvars
+import functools
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from config import settings
+from metrics import WRITE_BATCH_SIZE
+
+T = TypeVar("T")
+
+WriteOp = Callable[[AsyncSession], Awaitable[T]]
+
+
+class WriteCoalescer:
+    def __init__(self, sessionmaker: async_sessionmaker):
+        self.sessionmaker = sessionmaker
+        self._pending: list[tuple[WriteOp, asyncio.Future]] = []
+        self._batch_full: asyncio.Event | None = None
+        self._flushers: set[asyncio.Task] = set()
+
+    async def submit(self, op: WriteOp[T]) -> T:
+        """Queue ``op`` for the next batch and wait for the shared commit.
+        ``op`` must not commit; it gets the batch's session."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((op, future))
+
+        if len(self._pending) == 1:
+            # First write of a window: schedule its flush. An empty context
+            # keeps the batch's SQL out of this request's query tracker.
+            self._batch_full = asyncio.Event()
+            flusher = contextvars.Context().run(
+                asyncio.create_task,
+                self._flush_after_window(self._batch_full, self._pending),
+            )
+            # The task outlives the request that started it if that request
+            # is cancelled; hold a reference until it finishes.
+            self._flushers.add(flusher)
+            flusher.add_done_callback(
+                functools.partial(self._flusher_done, batch=self._pending)
+            )
+        elif len(self._pending) >= settings.write_coalesce_max_batch:
+            self._batch_full.set()
+
+        return await future
+
+    async def _flush_after_window(
+        self, batch_full: asyncio.Event, batch: list[tuple[WriteOp, asyncio.Future]]
+    ) -> None:
+        try:
+            await asyncio.wait_for(
+                batch_full.wait(), settings.write_coalesce_window_ms / 1000
+            )
+        except asyncio.TimeoutError:
+            pass
+
+        self._pending = []
+        await self.flush(batch)
+
+    def _flusher_done(
+        self, flusher: asyncio.Task, batch: list[tuple[WriteOp, asyncio.Future]]
+    ) -> None:
+        self._flushers.discard(flusher)
+
+        if self._pending is batch:
+            # Died before taking its batch: the next write opens a new one.
+            self._pending = []
+
+        # A flusher cancelled or broken outside flush() must not leave its
+        # writers waiting on their futures forever.
+        exc = None if flusher.cancelled() else flusher.exception()
+        for _, future in batch:
+            if future.done():
+                continue
+            if exc is None:
+                future.cancel()
+            else:
+                future.set_exception(exc)
+
+    async def flush(self, batch: list[tuple[WriteOp, asyncio.Future]]) -> None:
+        WRITE_BATCH_SIZE.observe(len(batch))
+        applied = []
+
+        try:
+            async with self.sessionmaker() as session:
+                conn = await session.connection()
+                if conn.dialect.name == "sqlite":
+                    # Take the writer lock once, up front, and give the
+                    # savepoints a real transaction to nest in.
+                    await conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+                for op, future in batch:
+                    if future.done():
+                        # Its caller gave up (disconnected) while waiting.
+                        continue
+
+                    try:
+                        async with session.begin_nested():
+                            result = await op(session)
+                    except Exception as exc:
+                        if not future.done():
+                            future.set_exception(exc)
+                    else:
+                        applied.append((future, result))
+
+                await session.commit()
+        except Exception as exc:
+            # Nothing in the batch was committed.
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, result in applied:
+            if not future.done():
+                future.set_result(result)
+
+
+_coalescers: dict[async_sessionmaker, WriteCoalescer] = {}
+
+
+def write_coalescer(sessionmaker: async_sessionmaker) -> WriteCoalescer | None:
+    """The coalescer for one database, or None when coalescing is off."""
+    if not settings.write_coalescing:
+        return None
+
+    coalescer = _coalescers.get(sessionmaker)
+    if coalescer is None:
+        coalescer = _coalescers[sessionmaker] = WriteCoalescer(sessionmaker)
+
+    return coalescer
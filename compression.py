@@ -0,0 +1,95 @@
+# compression.py
+"""Response compression: brotli when the client accepts it and the optional
+`brotli` package is installed, otherwise gzip. Bodies under the minimum size
+and event streams are sent as they are."""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = 4):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            # Flush so each streamed chunk reaches the client as it is sent.
+            return self.compressor.process(body) + self.compressor.flush()
+
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Codings named in an Accept-Encoding header, minus any sent with q=0."""
+    accepted = set()
+
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        encodings: list[str] | None = None,
+        minimum_size: int | None = None,
+    ):
+        self.app = app
+        encodings = settings.compression_encodings if encodings is None else encodings
+        # Brotli is skipped, not an error, when the package isn't installed.
+        self.encodings = [
+            encoding
+            for encoding in encodings
+            if encoding == "gzip" or (encoding == "br" and brotli is not None)
+        ]
+        self.minimum_size = (
+            settings.compression_minimum_size if minimum_size is None else minimum_size
+        )
+
+    def responder(self, encoding: str | None):
+        if encoding == "br":
+            return BrotliResponder(
+                self.app, self.minimum_size, settings.compression_brotli_quality
+            )
+        if encoding == "gzip":
+            return GZipResponder(
+                self.app, self.minimum_size, settings.compression_gzip_level
+            )
+        return None
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http" and self.encodings:
+            accepted = accepted_encodings(
+                Headers(scope=scope).get("accept-encoding", "")
+            )
+            encoding = next((e for e in self.encodings if e in accepted), None)
+
+        responder = self.responder(encoding)
+        if responder is None:
+            await self.app(scope, receive, send)
+            return
+
+        await responder(scope, receive, send)
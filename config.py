@@ -1,4 +1,5 @@
 # config.py
+from typing import Literal, cast
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,8 +7,105 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
     database_url: str
+    # When set, tasks live in these databases, routed by user_id; users stay
+    # in database_url. Changing the list requires moving existing tasks.
+    task_shard_urls: list[str] = []
+    # Read replicas of database_url for GET requests. For SQLite use a
+    # read-only URI, e.g. sqlite+aiosqlite:///file:replica.db?mode=ro&uri=true
+    database_replica_urls: list[str] = []
+    # A client that wrote (POST/PATCH/PUT/DELETE) reads from the primary
+    # for this long, so it sees its own writes. Clients are told apart by
+    # their token's user, or by address before they have one.
+    replica_read_after_write_seconds: float = 5.0
+    replica_pin_cache_size: int = 10_000
+    # A replica that fails to connect or lags is skipped for this long
+    replica_retry_seconds: float = 30.0
+    # Optional SQL returning a replica's lag in seconds, e.g. on PostgreSQL
+    # "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+    replica_lag_query: str | None = None
+    replica_max_lag_seconds: float = 5.0
+    replica_lag_check_seconds: float = 1.0
     access_token_expires_minutes: int
+    # Also adds X-DB-Queries / X-DB-Time headers to every response
     debug: bool = False
+    slow_query_ms: int = 200
+    repeated_query_threshold: int = 5
+    page_default_limit: int = 50
+    page_max_limit: int = 200
+    bulk_max_items: int = 500
+    # Tasks deleted per transaction by a background user purge
+    purge_chunk_size: int = 1000
+    export_batch_size: int = 1000
+    # Verified tokens, per worker; also how long other workers may still
+    # serve reads to a user deleted elsewhere
+    token_cache_size: int = 10_000
+    token_cache_ttl_seconds: int = 300
+
+    # Engine / pool
+    db_pool_class: Literal["queue", "null", "static"] = "queue"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Ignored for SQLite
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = -1
+    db_echo: bool = False
+
+    # PRAGMAs applied to every new SQLite connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64_000  # negative = KiB, i.e. ~64 MB
+
+    # Argon2 runs on its own bounded executor so logins can't starve the API
+    hash_executor: Literal["thread", "process"] = "thread"
+    hash_workers: int = 2
+    hash_queue_size: int = 32
+    hash_retry_after_seconds: int = 1
+
+    # Concurrent requests per route group; each also gets a bounded wait
+    # queue and a deadline before it is shed with 503. Unlisted paths are
+    # not limited; the most specific prefix wins, so long-lived event
+    # streams get their own group instead of holding /tasks slots.
+    admission_limits: dict[str, int] = {
+        "/auth": 8,
+        "/tasks": 64,
+        "/tasks/stream": 1000,
+        "/users": 32,
+    }
+    admission_queue_size: int = 128
+    admission_timeout_seconds: float = 2.0
+    admission_retry_after_seconds: int = 1
+
+    # Group commit: concurrent task writes share one transaction, flushed
+    # after the window or once max_batch writes are waiting
+    write_coalescing: bool = False
+    write_coalesce_window_ms: float = 2.0
+    write_coalesce_max_batch: int = 64
+
+    # Task event streams (GET /tasks/stream): per-client queue, keep-alive
+    # interval, and how many recent events per user are kept for
+    # Last-Event-ID resume
+    sse_queue_size: int = 100
+    sse_heartbeat_seconds: float = 15.0
+    sse_replay_size: int = 100
+    sse_replay_users: int = 10_000
+    sse_replay_ttl_seconds: int = 300
+
+    # Response compression, in order of preference; "br" needs the optional
+    # brotli package and is skipped without it. An empty list disables it.
+    compression_encodings: list[str] = ["br", "gzip"]
+    compression_minimum_size: int = 1000
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Startup work done in the lifespan, before the first request
+    db_warm_connections: int = 2
+    openapi_precompute: bool = False
+
+    # Per-user token bucket on /tasks; 0 disables it
+    rate_limit_per_second: float = 20.0
+    rate_limit_burst: int = 40
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -15,4 +113,36 @@ class Settings(BaseSettings):
     )
 
 
-settings = Settings()
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """The process-wide settings, read from the environment on first use."""
+    global _settings
+
+    if _settings is None:
+        _settings = Settings()
+
+    return _settings
+
+
+def configure(new_settings: Settings) -> Settings:
+    """Replace the process-wide settings. Call before create_app() and
+    before importing modules that size things from settings at import."""
+    global _settings
+
+    _settings = new_settings
+    return new_settings
+
+
+class _SettingsProxy:
+    # `from config import settings` stays valid everywhere while the actual
+    # Settings() is only built (and the environment read) on first access.
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = cast(Settings, _SettingsProxy())
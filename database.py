@@ -1,27 +1,352 @@
 # database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from sqlalchemy.pool import StaticPool
+import itertools
+import time
+import jwt
+from jwt.exceptions import InvalidTokenError
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from fastapi import Request
+from fastapi.security.utils import get_authorization_scheme_param
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, StaticPool
+from cache import TTLCache
 from config import settings
+from metrics import DB_READ_SESSIONS
+from sqltracker import instrument_engine
 
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=True,
-)
+POOL_CLASSES = {
+    "queue": AsyncAdaptedQueuePool,
+    "null": NullPool,
+    "static": StaticPool,
+}
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+
+def engine_options(url: str) -> dict:
+    pool_class = POOL_CLASSES[settings.db_pool_class]
+
+    # Every pooled connection to an in-memory database would get its own,
+    # empty database, so those always share a single connection.
+    if is_sqlite_memory(url):
+        pool_class = StaticPool
+
+    options = {
+        "poolclass": pool_class,
+        # A local SQLite file never goes stale; don't pay a SELECT 1 (and a
+        # thread hop on aiosqlite) on every checkout.
+        "pool_pre_ping": settings.db_pool_pre_ping and not is_sqlite(url),
+        "pool_recycle": settings.db_pool_recycle,
+        "echo": settings.db_echo,
+    }
+
+    if pool_class is AsyncAdaptedQueuePool:
+        options["pool_size"] = settings.db_pool_size
+        options["max_overflow"] = settings.db_max_overflow
+
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+    cursor.close()
+
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def build_engine(url: str, foreign_keys: bool = False) -> AsyncEngine:
+    new_engine = create_async_engine(url, **engine_options(url))
+
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+        # SQLite ignores FOREIGN KEY clauses, ON DELETE CASCADE included,
+        # unless asked per connection.
+        if foreign_keys:
+            event.listen(new_engine.sync_engine, "connect", enable_sqlite_foreign_keys)
+
+    instrument_engine(new_engine)
+    return new_engine
+
+
+def make_sessionmaker(bind: AsyncEngine) -> async_sessionmaker:
+    # expire_on_commit=False: attribute access after commit must not trigger
+    # implicit IO, which AsyncSession cannot do.
+    return async_sessionmaker(
+        bind=bind, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+# Built by init_engines() from the app's lifespan (or a script), so importing
+# this module doesn't open anything.
+engine: AsyncEngine | None = None
+SessionLocal: async_sessionmaker | None = None
+shard_engines: list[AsyncEngine] = []
+shard_sessions: list[async_sessionmaker] = []
+replicas: list["Replica"] = []
+recent_writers: TTLCache | None = None
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    unavailable_until: float = 0.0
+    lag_checked_at: float = float("-inf")
+
+
+class ReplicaLagging(Exception):
+    pass
+
+
+def init_engines() -> None:
+    global engine, SessionLocal, shard_engines, shard_sessions
+    global replicas, recent_writers
+
+    if engine is not None:
+        return
+
+    engine = build_engine(settings.database_url, foreign_keys=True)
+    SessionLocal = make_sessionmaker(engine)
+    # Shards hold tasks whose users live in the main database, so their
+    # foreign keys can't be enforced.
+    shard_engines = [build_engine(url) for url in settings.task_shard_urls]
+    shard_sessions = [make_sessionmaker(shard_engine) for shard_engine in shard_engines]
+
+    replica_engines = [build_engine(url) for url in settings.database_replica_urls]
+    replicas = [
+        Replica(replica_engine, make_sessionmaker(replica_engine))
+        for replica_engine in replica_engines
+    ]
+    recent_writers = TTLCache(
+        maxsize=settings.replica_pin_cache_size, clock=time.monotonic
+    )
+
+
+async def warm_engine(target: AsyncEngine, count: int) -> None:
+    """Check out `count` connections at once so the pool keeps them open."""
+    if isinstance(target.pool, NullPool):
+        return
+
+    if not isinstance(target.pool, AsyncAdaptedQueuePool):
+        count = 1
+
+    async with AsyncExitStack() as stack:
+        for _ in range(count):
+            conn = await stack.enter_async_context(target.connect())
+            await conn.exec_driver_sql("SELECT 1")
+
+
+async def warm_engines() -> None:
+    """Connect (and run the SQLite PRAGMAs) before the first request does."""
+    init_engines()
+    count = min(settings.db_warm_connections, settings.db_pool_size)
+
+    if count <= 0:
+        return
+
+    for target in (engine, *shard_engines):
+        await warm_engine(target, count)
+
+    for replica in replicas:
+        try:
+            await warm_engine(replica.engine, count)
+        except (DBAPIError, OSError):
+            # Reads fall back to the primary until it is back.
+            replica.unavailable_until = (
+                time.monotonic() + settings.replica_retry_seconds
+            )
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+def shard_for(user_id: int, shard_count: int) -> int:
+    # Plain modulo is stable across processes and restarts, unlike hash().
+    return user_id % shard_count
 
-def get_db():
-    db = SessionLocal()
 
-    try:
+def is_sharded() -> bool:
+    init_engines()
+    return bool(shard_sessions)
+
+
+def task_sessionmaker(user_id: int) -> async_sessionmaker | None:
+    """Session factory for the shard holding ``user_id``'s tasks, or None
+    when sharding is off and tasks live next to users."""
+    init_engines()
+
+    if not shard_sessions:
+        return None
+
+    return shard_sessions[shard_for(user_id, len(shard_sessions))]
+
+
+_replica_turn = itertools.count()
+
+
+async def check_replica(session: AsyncSession, replica: Replica, now: float) -> None:
+    # Checking out a connection fails fast when the replica is unreachable.
+    await session.connection()
+
+    if (
+        settings.replica_lag_query
+        and now - replica.lag_checked_at >= settings.replica_lag_check_seconds
+    ):
+        lag = await session.scalar(text(settings.replica_lag_query))
+        replica.lag_checked_at = now
+
+        if lag is not None and lag > settings.replica_max_lag_seconds:
+            raise ReplicaLagging(lag)
+
+
+async def open_replica_session() -> AsyncSession | None:
+    """A session on the next healthy replica (round robin), or None."""
+    now = time.monotonic()
+
+    for _ in range(len(replicas)):
+        replica = replicas[next(_replica_turn) % len(replicas)]
+
+        if replica.unavailable_until > now:
+            continue
+
+        session = replica.sessionmaker()
+        try:
+            await check_replica(session, replica, now)
+            return session
+        except (DBAPIError, OSError, ReplicaLagging):
+            await session.close()
+            replica.unavailable_until = now + settings.replica_retry_seconds
+
+    return None
+
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def user_key(username: str) -> str:
+    return f"user:{username}"
+
+
+def client_key(request: Request) -> str:
+    """Who read-after-write pinning applies to: the bearer token's user, or
+    the address for calls made without one (/auth). Many clients can share
+    one address behind a proxy, so it is only the fallback."""
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+
+    if scheme.lower() == "bearer" and token:
+        # Imported here: security imports this module for get_db.
+        from security import token_cache
+
+        # A cached token was verified already; only decode on a miss.
+        cached_user = token_cache.get(token)
+        if cached_user is not None:
+            return user_key(cached_user.username)
+
+        try:
+            payload = jwt.decode(
+                token, settings.secret_key, algorithms=[settings.algorithm]
+            )
+        except InvalidTokenError:
+            payload = {}
+
+        if payload.get("sub") is not None:
+            return user_key(payload["sub"])
+
+    return f"addr:{request.client.host if request.client else ''}"
+
+
+def pin_to_primary(key: str) -> float | None:
+    """Send ``key``'s reads to the primary for a while. Returns the pin it
+    replaced, for unpin()."""
+    if not replicas:
+        return None
+
+    previous = recent_writers.get(key)
+    expires_at = time.monotonic() + settings.replica_read_after_write_seconds
+    recent_writers.set(key, expires_at, expires_at)
+    return previous
+
+
+def unpin(key: str, previous: float | None) -> None:
+    if previous is None:
+        recent_writers.discard(key)
+    else:
+        recent_writers.set(key, previous, previous)
+
+
+async def get_db(request: Request):
+    """Session for the request: read-only requests go to a replica unless
+    the client wrote recently; everything else goes to the primary."""
+    init_engines()
+
+    if replicas:
+        key = client_key(request)
+
+        if request.method not in READ_METHODS:
+            # Pinned before the write, so the very next read can't race it;
+            # a write that fails leaves the previous pin as it was.
+            previous = pin_to_primary(key)
+            try:
+                async with SessionLocal() as db:
+                    yield db
+            except Exception:
+                unpin(key, previous)
+                raise
+            return
+
+        if recent_writers.get(key) is None:
+            replica_db = await open_replica_session()
+
+            if replica_db is not None:
+                DB_READ_SESSIONS.labels("replica").inc()
+                async with replica_db:
+                    yield replica_db
+                return
+
+        DB_READ_SESSIONS.labels("primary").inc()
+
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def dispose_engines() -> None:
+    global engine, SessionLocal, shard_engines, shard_sessions
+    global replicas, recent_writers
+
+    for target in (engine, *shard_engines, *(replica.engine for replica in replicas)):
+        if target is not None:
+            await target.dispose()
+
+    engine = SessionLocal = recent_writers = None
+    shard_engines = []
+    shard_sessions = []
+    replicas = []
 
 
 class Base(DeclarativeBase):
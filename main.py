@@ -1,13 +1,17 @@
 # main.py
-from fastapi import FastAPI
-from routers.auth import router as auth_router
-from routers.user import router as user_router
-from routers.task import router as task_router
-from fastapi.middleware.cors import CORSMiddleware
-from config import settings
+"""Application factory.
+
+Nothing heavy happens at import: routers (and with them the models, Argon2
+and SQLAlchemy) are imported by create_app(), and engines, the password
+hasher and warm connections are set up by the lifespan. `uvicorn main:app`
+still works; `app` is built on first access.
+"""
 
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from config import Settings, configure, settings
 
-app = FastAPI()
 
 origins = [
     "http://localhost:3000",  # React dev
@@ -16,30 +20,85 @@ origins = [
     "https://app.yourdomain.com",
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
-app.include_router(user_router, prefix="/users", tags=["Users"])
-app.include_router(task_router, prefix="/tasks", tags=["Tasks"])
-
-
-# Root endpoint
-@app.get("/", tags=["Root"])
-def read_root():
-    return {
-        "message": "Welcome to Task Manager API",
-        "docs": "/docs",
-        "redoc": "/redoc",
-    }
-
-
-# Health check endpoint
-@app.get("/health", tags=["Health"])
-def health_check():
-    return {"status": "healthy"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from broker import broker
+    from database import dispose_engines, warm_engines
+    from purge import drain_purges
+    from security import get_password_hasher, shutdown_hash_executor
+
+    get_password_hasher()
+    await warm_engines()
+    await broker.start()
+
+    if settings.openapi_precompute:
+        # FastAPI caches this on app.openapi_schema for /openapi.json.
+        app.openapi()
+
+    yield
+    await broker.stop()
+    await drain_purges()
+    shutdown_hash_executor()
+    await dispose_engines()
+
+
+def create_app(app_settings: Settings | None = None) -> FastAPI:
+    """Build the API. `app_settings`, when given, become the process-wide
+    settings before any router is imported."""
+    if app_settings is not None:
+        configure(app_settings)
+
+    from routers.auth import router as auth_router
+    from routers.user import router as user_router
+    from routers.task import router as task_router
+    from routers.system import router as system_router
+    from admission import AdmissionMiddleware, enforce_rate_limit
+    from compression import CompressionMiddleware
+    from metrics import MetricsMiddleware
+    from sqltracker import QueryTrackingMiddleware
+
+    app = FastAPI(lifespan=lifespan)
+
+    # Innermost, so shed requests still get CORS headers and show up in metrics.
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(CompressionMiddleware)
+
+    # Outermost, so latency includes every other middleware; the query tracker
+    # wraps it so metrics can read the request's DB totals.
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(QueryTrackingMiddleware)
+
+    app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
+    app.include_router(user_router, prefix="/users", tags=["Users"])
+    app.include_router(
+        task_router,
+        prefix="/tasks",
+        tags=["Tasks"],
+        dependencies=[Depends(enforce_rate_limit)],
+    )
+    app.include_router(system_router)
+
+    return app
+
+
+_app: FastAPI | None = None
+
+
+def __getattr__(name: str):
+    # Module-level `app` for `uvicorn main:app` and `from main import app`.
+    global _app
+
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
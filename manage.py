@@ -0,0 +1,243 @@
+# manage.py
+"""Maintenance commands.
+
+python manage.py rebuild-task-stats
+python manage.py purge-deleted-users
+python manage.py import-users users.csv --batch-size 1000 --workers 8
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import dispose_engines, init_engines
+from purge import purge_deleted_users
+from schemas import UserCreate
+from security import _hash
+import database
+import models
+
+
+def task_sessionmakers() -> list:
+    """Every database that holds tasks: the shards, or the main database."""
+    init_engines()
+    return database.shard_sessions or [database.SessionLocal]
+
+
+async def rebuild_task_counters(db: AsyncSession) -> int:
+    """Recount every user's tasks and overwrite the materialized totals.
+
+    Returns the number of users with tasks.
+    """
+    counter = models.TaskCounter
+
+    # Write first so SQLite takes the writer lock before counting.
+    await db.execute(update(counter).values(total=0, completed=0))
+
+    result = await db.execute(
+        select(
+            models.Task.user_id,
+            func.count(),
+            func.sum(case((models.Task.is_completed, 1), else_=0)),
+            func.max(models.Task.version),
+        ).group_by(models.Task.user_id)
+    )
+    counts = {
+        user_id: (total, completed, version)
+        for user_id, total, completed, version in result
+    }
+
+    existing = set((await db.execute(select(counter.user_id))).scalars())
+    rows = [
+        {"user_id": user_id, "total": total, "completed": completed}
+        for user_id, (total, completed, _) in counts.items()
+    ]
+
+    updates = [row for row in rows if row["user_id"] in existing]
+    # A recreated counter continues from the newest task version, so delta
+    # sync never sees versions go backwards.
+    inserts = [
+        {**row, "revision": counts[row["user_id"]][2]}
+        for row in rows
+        if row["user_id"] not in existing
+    ]
+
+    if updates:
+        await db.execute(update(counter), updates)
+    if inserts:
+        await db.execute(insert(counter), inserts)
+
+    await db.commit()
+    return len(counts)
+
+
+async def rebuild_task_stats() -> None:
+    for sessionmaker in task_sessionmakers():
+        async with sessionmaker() as db:
+            users = await rebuild_task_counters(db)
+        print(f"{db.bind.url.render_as_string()}: rebuilt counters for {users} users")
+
+
+async def finish_purges() -> None:
+    """Resume background user purges that were interrupted."""
+    purged = await purge_deleted_users()
+    for user_id, tasks in purged.items():
+        print(f"user {user_id}: purged {tasks} tasks")
+    print(f"purged {len(purged)} users")
+
+
+def read_user_rows(path: Path) -> Iterator[dict]:
+    """Rows with username, email and password from a CSV (with a header
+    line) or a JSON-lines file."""
+    with path.open(newline="") as file:
+        if path.suffix in (".jsonl", ".ndjson"):
+            yield from (json.loads(line) for line in file if line.strip())
+        else:
+            yield from csv.DictReader(file)
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def taken_names(users: list[UserCreate]) -> tuple[set, set]:
+    async with database.SessionLocal() as db:
+        result = await db.execute(
+            select(models.User.username, models.User.email).where(
+                models.User.username.in_({user.username for user in users})
+                | models.User.email.in_({user.email for user in users})
+            )
+        )
+        rows = result.all()
+
+    return {row.username for row in rows}, {row.email for row in rows}
+
+
+async def import_user_batch(
+    users: list[UserCreate], executor: Executor, seen: tuple[set, set]
+) -> int:
+    """Hash the new users' passwords in parallel and insert them with one
+    executemany. Users already in the database or earlier in the import are
+    skipped before hashing; one registered while hashing is skipped by the
+    insert. Returns the number inserted."""
+    usernames, emails = seen
+    taken_usernames, taken_emails = (
+        await taken_names(users) if users else (set(), set())
+    )
+
+    fresh = []
+    for user in users:
+        if (
+            user.username in usernames
+            or user.email in emails
+            or user.username in taken_usernames
+            or user.email in taken_emails
+        ):
+            continue
+        usernames.add(user.username)
+        emails.add(user.email)
+        fresh.append(user)
+
+    if not fresh:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    hashes = await asyncio.gather(
+        *(loop.run_in_executor(executor, _hash, user.password) for user in fresh)
+    )
+
+    async with database.SessionLocal() as db:
+        # Registrations can take a name after taken_names() looked; skip
+        # those rows rather than fail the batch that was already hashed.
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        result = await db.execute(
+            dialect.insert(models.User)
+            .on_conflict_do_nothing()
+            .returning(models.User.id),
+            [
+                {**user.model_dump(exclude={"password"}), "hashed_password": hashed}
+                for user, hashed in zip(fresh, hashes)
+            ],
+        )
+        inserted = len(result.all())
+        await db.commit()
+
+    return inserted
+
+
+async def import_users(
+    path: Path, batch_size: int = 1000, workers: int | None = None
+) -> dict[str, int]:
+    """Bulk-create users from a file. Returns imported/skipped/invalid counts."""
+    init_engines()
+    stats = Counter(imported=0, skipped=0, invalid=0)
+    seen = (set(), set())
+
+    # Argon2 is CPU-bound: one process per core (or --workers).
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rows in batched(read_user_rows(path), batch_size):
+            users = []
+            for row in rows:
+                try:
+                    users.append(UserCreate.model_validate(row))
+                except ValidationError:
+                    stats["invalid"] += 1
+
+            imported = await import_user_batch(users, executor, seen)
+            stats["imported"] += imported
+            stats["skipped"] += len(users) - imported
+
+    return dict(stats)
+
+
+async def import_users_command(path: Path, batch_size: int, workers: int | None):
+    stats = await import_users(path, batch_size, workers)
+    print(", ".join(f"{key} {count}" for key, count in stats.items()))
+
+
+COMMANDS = {
+    "rebuild-task-stats": rebuild_task_stats,
+    "purge-deleted-users": finish_purges,
+    "import-users": import_users_command,
+}
+
+
+async def run(command: str, options: dict) -> None:
+    try:
+        await COMMANDS[command](**options)
+    finally:
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Task Manager maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-task-stats", help="recount task_counters")
+    commands.add_parser("purge-deleted-users", help="finish background purges")
+
+    import_parser = commands.add_parser(
+        "import-users", help="bulk-create users from CSV or JSON lines"
+    )
+    import_parser.add_argument("path", type=Path)
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+    import_parser.add_argument(
+        "--workers", type=int, default=None, help="hashing processes (default: CPUs)"
+    )
+
+    options = vars(parser.parse_args())
+    asyncio.run(run(options.pop("command"), options))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# metrics.py
+"""Prometheus metrics: per-route HTTP traffic, DB usage and Argon2 timings.
+
+Set PROMETHEUS_MULTIPROC_DIR (an empty, writable directory) before starting
+several uvicorn workers and /metrics aggregates all of them.
+"""
+
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqltracker import current_tracker
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"]
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per request", ["route"]
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Argon2 compute time", ["operation"]
+)
+PASSWORD_HASH_WAIT_SECONDS = Histogram(
+    "password_hash_wait_seconds", "Time queued for a hashing worker", ["operation"]
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total", "Hash requests refused with 503", ["operation"]
+)
+
+ADMISSION_ACTIVE = Gauge(
+    "admission_active_requests",
+    "Requests holding an admission slot",
+    ["group"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time queued for an admission slot", ["group"]
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests shed with 503, by reason (queue_full or timeout)",
+    ["group", "reason"],
+)
+RATE_LIMITED = Counter(
+    "rate_limited_total", "Requests refused with 429 by the per-user rate limit"
+)
+
+DB_READ_SESSIONS = Counter(
+    "db_read_sessions_total",
+    "Sessions opened for read-only requests, by where they went",
+    ["target"],
+)
+
+WRITE_BATCH_SIZE = Histogram(
+    "write_coalescer_batch_size",
+    "Task writes committed together by the write coalescer",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+SSE_SUBSCRIBERS = Gauge(
+    "sse_subscribers",
+    "Open task event streams",
+    multiprocess_mode="livesum",
+)
+SSE_DROPPED = Counter(
+    "sse_subscribers_dropped_total",
+    "Event streams ended because the client fell behind its queue",
+)
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            IN_FLIGHT.dec()
+
+            method = scope["method"]
+            route = route_label(scope)
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+
+            # Set by the enclosing QueryTrackingMiddleware.
+            tracker = current_tracker.get()
+            if tracker is not None:
+                DB_QUERIES.labels(route).observe(tracker.queries)
+                DB_TIME.labels(route).observe(tracker.seconds)
+
+
+def render_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry)
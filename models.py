@@ -1,6 +1,7 @@
 # models.py
+from datetime import datetime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import DDL, ForeignKey, Index, String, column, event, table
 from database import Base
 
 
@@ -11,10 +12,66 @@ class Task(Base):
     title: Mapped[str] = mapped_column(String(100), nullable=False)
     is_completed: Mapped[bool] = mapped_column(default=False, nullable=False)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
+    # The user's task revision (TaskCounter.revision) at this row's last write;
+    # delta sync returns rows with a version above the client's.
+    version: Mapped[int] = mapped_column(default=0, nullable=False)
     user: Mapped["User"] = relationship(back_populates="tasks")
 
+    __table_args__ = (
+        # Serves the is_completed filter and keyset paging in one index walk.
+        Index("ix_tasks_user_completed_id", "user_id", "is_completed", "id"),
+        Index("ix_tasks_user_id_version", "user_id", "version"),
+    )
+
+
+# External-content FTS5 index over tasks.title (SQLite only), kept in sync by
+# triggers. The same statements are applied by the Alembic migration.
+tasks_fts = table("tasks_fts", column("rowid"), column("title"))
+
+TASKS_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts "
+    "USING fts5(title, content='tasks', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, title) "
+    "VALUES ('delete', old.id, old.title); "
+    "INSERT INTO tasks_fts(rowid, title) VALUES (new.id, new.title); END",
+)
+
+for statement in TASKS_FTS_DDL:
+    event.listen(
+        Task.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+
+event.listen(
+    Task.__table__,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect="sqlite"),
+)
+
+
+class TaskTombstone(Base):
+    """Left behind by a task delete, so delta sync can report it."""
+
+    __tablename__ = "task_tombstones"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    task_id: Mapped[int] = mapped_column(nullable=False)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    version: Mapped[int] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_tombstones_user_id_version", "user_id", "version"),
+    )
+
 
 class User(Base):
     __tablename__ = "users"
@@ -23,6 +80,26 @@ class User(Base):
     username: Mapped[str] = mapped_column(unique=True, nullable=False)
     email: Mapped[str] = mapped_column(unique=True, nullable=False)
     hashed_password: Mapped[str] = mapped_column(String(255), nullable=False)
+    # Set when a background purge is under way; the user is hidden from then on.
+    deleted_at: Mapped[datetime | None] = mapped_column(default=None)
+    # The database deletes tasks with their user (ON DELETE CASCADE), so the
+    # ORM never loads them just to delete them one by one.
     tasks: Mapped[list["Task"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+class TaskCounter(Base):
+    """Per-user bookkeeping kept next to the user's tasks (same shard)."""
+
+    __tablename__ = "task_counters"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
     )
+    # Bumped by every task write; list ETags, event ids and task versions
+    # are derived from it.
+    revision: Mapped[int] = mapped_column(default=0, nullable=False)
+    # Materialized counts, maintained in the same transaction as task writes.
+    total: Mapped[int] = mapped_column(default=0, nullable=False)
+    completed: Mapped[int] = mapped_column(default=0, nullable=False)
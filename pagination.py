@@ -0,0 +1,66 @@
+# pagination.py
+import base64
+import binascii
+from fastapi import HTTPException, status
+from config import settings
+
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, settings.page_max_limit))
+
+
+def _encode(*values: int) -> str:
+    text = ".".join(str(value) for value in values)
+    return base64.urlsafe_b64encode(text.encode()).rstrip(b"=").decode()
+
+
+def _decode(cursor: str, count: int) -> list[int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = [
+            int(value)
+            for value in base64.urlsafe_b64decode(padded.encode()).decode().split(".")
+        ]
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = []
+
+    if len(values) != count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+    return values
+
+
+def encode_cursor(last_id: int) -> str:
+    return _encode(last_id)
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    if not cursor:
+        return None
+
+    return _decode(cursor, 1)[0]
+
+
+def encode_change_cursor(version: int, last_id: int) -> str:
+    """Position in the (version, id) order of GET /tasks/changes."""
+    return _encode(version, last_id)
+
+
+def decode_change_cursor(cursor: str) -> tuple[int, int]:
+    version, last_id = _decode(cursor, 2)
+    return version, last_id
+
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    """Return the cursor for the page after ``rows``.
+
+    ``rows`` is expected to hold up to ``limit + 1`` items ordered by id; the
+    extra item only signals that another page exists and is dropped.
+    """
+    if len(rows) <= limit:
+        return None
+
+    del rows[limit:]
+    return encode_cursor(rows[-1].id)
@@ -0,0 +1,38 @@
+# projection.py
+from typing import Iterable
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import Row
+
+
+def parse_fields(fields: str | None, schema: type[BaseModel]) -> list[str] | None:
+    """Field names picked by a sparse fieldset, ``?fields=id,title``, in
+    schema order. ``id`` is always included, since cursors and ETags are
+    keyed on it. None means every field."""
+    if fields is None:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - schema.model_fields.keys()
+
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+
+    requested.add("id")
+    return [name for name in schema.model_fields if name in requested]
+
+
+def columns_for(
+    model, schema: type[BaseModel], fields: list[str] | None = None
+) -> list:
+    """ORM columns backing every field of ``schema`` (or just ``fields``),
+    in field order."""
+    names = schema.model_fields if fields is None else fields
+    return [getattr(model, name) for name in names]
+
+
+def rows_to_dicts(rows: Iterable[Row]) -> list[dict]:
+    return [row._asdict() for row in rows]
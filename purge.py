@@ -0,0 +1,109 @@
+# purge.py
+"""Background removal of soft-deleted users.
+
+Tasks go in chunks of PURGE_CHUNK_SIZE, each in its own short transaction, so
+the writer lock is never held for long. An interrupted purge leaves the user
+soft-deleted; `python manage.py purge-deleted-users` finishes it.
+
+Purges requested over HTTP run as their own asyncio tasks, outside the
+request, so they hold no admission slot and don't count toward its latency.
+The lifespan waits for them on shutdown.
+"""
+
+import asyncio
+import contextvars
+import logging
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import init_engines, task_sessionmaker
+import database
+import models
+
+
+logger = logging.getLogger(__name__)
+
+_running: set[asyncio.Task] = set()
+
+
+async def purge_user_tasks(task_db: AsyncSession, user_id: int) -> int:
+    """Delete the user's tasks, counters and tombstones. Returns the number
+    of tasks."""
+    purged = 0
+
+    while True:
+        chunk = (
+            select(models.Task.id)
+            .where(models.Task.user_id == user_id)
+            .limit(settings.purge_chunk_size)
+        )
+        result = await task_db.execute(
+            delete(models.Task).where(models.Task.id.in_(chunk))
+        )
+        await task_db.commit()
+        purged += result.rowcount
+
+        if result.rowcount < settings.purge_chunk_size:
+            break
+
+        # Let other writers in between chunks.
+        await asyncio.sleep(0)
+
+    await task_db.execute(
+        delete(models.TaskCounter).where(models.TaskCounter.user_id == user_id)
+    )
+    await task_db.execute(
+        delete(models.TaskTombstone).where(models.TaskTombstone.user_id == user_id)
+    )
+    await task_db.commit()
+    return purged
+
+
+async def purge_user(user_id: int) -> int:
+    init_engines()
+    sessionmaker = task_sessionmaker(user_id) or database.SessionLocal
+
+    async with sessionmaker() as task_db:
+        purged = await purge_user_tasks(task_db, user_id)
+
+    async with database.SessionLocal() as db:
+        await db.execute(delete(models.User).where(models.User.id == user_id))
+        await db.commit()
+
+    return purged
+
+
+async def purge_deleted_users() -> dict[int, int]:
+    """Finish every pending purge. Returns tasks purged per user id."""
+    init_engines()
+
+    async with database.SessionLocal() as db:
+        result = await db.scalars(
+            select(models.User.id).where(models.User.deleted_at.is_not(None))
+        )
+        user_ids = result.all()
+
+    return {user_id: await purge_user(user_id) for user_id in user_ids}
+
+
+def _purge_done(task: asyncio.Task) -> None:
+    _running.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background purge failed", exc_info=task.exception())
+
+
+def schedule_purge(user_id: int) -> asyncio.Task:
+    """Start purging ``user_id`` without waiting for it."""
+    # An empty context, so the purge's queries aren't counted against the
+    # request that scheduled it.
+    task = contextvars.Context().run(asyncio.create_task, purge_user(user_id))
+    _running.add(task)
+    task.add_done_callback(_purge_done)
+    return task
+
+
+async def drain_purges() -> None:
+    """Wait for every scheduled purge to finish."""
+    while _running:
+        await asyncio.gather(*_running, return_exceptions=True)
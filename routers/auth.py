@@ -1,13 +1,15 @@
 # routers.auth.py
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select
 from datetime import timedelta
 from typing import Annotated
 from schemas import Token, UserOut, UserCreate
-from database import get_db
+from database import get_db, pin_to_primary, user_key
 from security import verify_password, create_access_token, hash_password
+from projection import columns_for
 from config import settings
 import models
 
@@ -15,40 +17,44 @@ router = APIRouter()
 
 
 @router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Annotated[Session, Depends(get_db)]):
-    existing_user = db.execute(
-        select(models.User).where(
-            (models.User.username == user.username) | (models.User.email == user.email)
-        )
-    ).scalar_one_or_none()
+async def create_user(user: UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
+    hashed_password = await hash_password(user.password)
 
-    if existing_user:
+    # One INSERT ... RETURNING. The unique constraints decide duplicates, so
+    # two concurrent registrations can't both pass a separate check.
+    try:
+        result = await db.execute(
+            insert(models.User)
+            .values(
+                **user.model_dump(exclude={"password"}),
+                hashed_password=hashed_password,
+            )
+            .returning(*columns_for(models.User, UserOut))
+        )
+        created = result.one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Username or email already in use.",
         )
 
-    hashed_password = hash_password(user.password)
-    db_user = models.User(
-        **user.model_dump(exclude={"password"}), hashed_password=hashed_password
-    )
-
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    return db_user
+    return created._asdict()
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_db)],
 ):
-    stmt = select(models.User).where(models.User.username == form_data.username)
-    db_user = db.execute(stmt).scalar_one_or_none()
+    stmt = select(models.User).where(
+        models.User.username == form_data.username, models.User.deleted_at.is_(None)
+    )
+    result = await db.execute(stmt)
+    db_user = result.scalar_one_or_none()
 
-    if db_user is None or not verify_password(
+    if db_user is None or not await verify_password(
         form_data.password, db_user.hashed_password
     ):
         raise HTTPException(
@@ -57,6 +63,10 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # The token's reads key on the user, not the address that registered
+    # them, so they too must see the primary for a while.
+    pin_to_primary(user_key(db_user.username))
+
     access_token = create_access_token(
         data={"sub": db_user.username},
         expire_delta=timedelta(minutes=settings.access_token_expires_minutes),
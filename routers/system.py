@@ -0,0 +1,34 @@
+# routers.system.py
+from fastapi import APIRouter, Response
+from metrics import CONTENT_TYPE_LATEST, render_metrics
+from security import token_cache
+
+router = APIRouter()
+
+
+# Root endpoint
+@router.get("/", tags=["Root"])
+def read_root():
+    return {
+        "message": "Welcome to Task Manager API",
+        "docs": "/docs",
+        "redoc": "/redoc",
+    }
+
+
+# Health check endpoint
+@router.get("/health", tags=["Health"])
+def health_check():
+    return {"status": "healthy"}
+
+
+# Token cache counters, used to size TOKEN_CACHE_SIZE
+@router.get("/health/cache", tags=["Health"])
+def cache_stats():
+    return {"token_cache": token_cache.stats()}
+
+
+# Prometheus scrape endpoint
+@router.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
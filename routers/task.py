@@ -1,89 +1,707 @@
 # routers.task.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import Annotated
-from schemas import TaskCreate, TaskOut, TaskUpdate
-from database import get_db
-from security import get_current_user
+import asyncio
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, insert, literal, null, or_, select, union_all, update
+from typing import Annotated, Literal
+from schemas import (
+    Page,
+    TaskBulkDelete,
+    TaskBulkResult,
+    TaskBulkUpdate,
+    TaskChanges,
+    TaskCreate,
+    TaskOut,
+    TaskStats,
+    TaskUpdate,
+)
+from database import get_db, task_sessionmaker
+from coalescer import write_coalescer
+from broker import Event, broker
+from security import CurrentUser, get_current_user
+from pagination import (
+    clamp_limit,
+    decode_change_cursor,
+    decode_cursor,
+    encode_change_cursor,
+    next_cursor,
+)
+from etag import etag_matches, make_etag, not_modified
+from projection import columns_for, parse_fields, rows_to_dicts
+from config import settings
+import database
 import models
 
 router = APIRouter()
 
 
-@router.get("", response_model=list[TaskOut])
-def list_tasks(
-    current_user: Annotated[models.User, Depends(get_current_user)],
-    db: Annotated[Session, Depends(get_db)],
+async def get_task_db(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
 ):
-    stmt = select(models.Task).where(models.Task.user_id == current_user.id)
-    db_tasks = db.execute(stmt).scalars().all()
+    sessionmaker = task_sessionmaker(current_user.id)
 
-    return db_tasks
+    if sessionmaker is None:
+        yield db
+        return
+
+    async with sessionmaker() as task_db:
+        yield task_db
+
+
+async def record_task_changes(
+    db: AsyncSession, user_id: int, total: int = 0, completed: int = 0
+) -> int:
+    """Bump the user's task revision and apply count deltas inside the
+    caller's transaction. Returns the new revision."""
+    counter = models.TaskCounter
+    result = await db.execute(
+        update(counter)
+        .where(counter.user_id == user_id)
+        .values(
+            revision=counter.revision + 1,
+            total=counter.total + total,
+            completed=counter.completed + completed,
+        )
+        .returning(counter.revision)
+    )
+    revision = result.scalar_one_or_none()
+
+    if revision is None:
+        revision = 1
+        db.add(
+            counter(
+                user_id=user_id, revision=revision, total=total, completed=completed
+            )
+        )
+
+    return revision
+
+
+def publish_task_event(
+    user_id: int, revision: int, event_type: str, tasks: list
+) -> None:
+    """Tell the user's open streams about a committed write. ``revision``
+    (from record_task_changes) is the event id; ``tasks`` are ORM tasks, rows
+    or dicts, or task ids for ``deleted``."""
+    if event_type == "deleted":
+        data = [{"id": task_id} for task_id in tasks]
+    else:
+        data = [TaskOut.model_validate(task).model_dump() for task in tasks]
+
+    broker.publish(user_id, Event(revision, event_type, data))
+
+
+async def apply_write(db: AsyncSession, user_id: int, op):
+    """Run ``op(session)`` and commit it: on ``db``, or batched with other
+    requests' writes when WRITE_COALESCING is on."""
+    coalescer = write_coalescer(task_sessionmaker(user_id) or database.SessionLocal)
+
+    if coalescer is None:
+        result = await op(db)
+        await db.commit()
+        return result
+
+    # Give this request's connection back while it waits on the batch, or
+    # waiting requests can hold the whole pool the flush itself needs.
+    await db.close()
+    return await coalescer.submit(op)
+
+
+async def get_owned_task(db: AsyncSession, user_id: int, task_id: int) -> models.Task:
+    result = await db.execute(
+        select(models.Task).where(
+            models.Task.id == task_id, models.Task.user_id == user_id
+        )
+    )
+    db_task = result.scalar_one_or_none()
+
+    if db_task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    return db_task
+
+
+def completed_delta(was_completed: bool, is_completed: bool) -> int:
+    return int(is_completed) - int(was_completed)
+
+
+def fts_query(q: str) -> str:
+    # Quote every term so user input can't inject FTS5 query syntax.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def check_bulk_size(items: list) -> None:
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"At most {settings.bulk_max_items} items per bulk request",
+        )
+
+
+@router.get("", response_model=Page[TaskOut])
+async def list_tasks(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = settings.page_default_limit,
+    is_completed: bool | None = None,
+    title_prefix: Annotated[str | None, Query(min_length=1)] = None,
+    q: Annotated[str | None, Query(min_length=1)] = None,
+    fields: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    limit = clamp_limit(limit)
+    selected = parse_fields(fields, TaskOut)
+
+    # Answer unchanged polls from the revision row alone.
+    revision = await db.scalar(
+        select(models.TaskCounter.revision).where(
+            models.TaskCounter.user_id == current_user.id
+        )
+    )
+    etag = make_etag(
+        "tasks",
+        current_user.id,
+        revision or 0,
+        cursor,
+        limit,
+        is_completed,
+        title_prefix,
+        q,
+        selected,
+    )
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    stmt = select(*columns_for(models.Task, TaskOut, selected)).where(
+        models.Task.user_id == current_user.id
+    )
+
+    if is_completed is not None:
+        stmt = stmt.where(models.Task.is_completed == is_completed)
+
+    if title_prefix is not None:
+        stmt = stmt.where(models.Task.title.startswith(title_prefix, autoescape=True))
+
+    if q is not None and q.strip():
+        if db.get_bind().dialect.name == "sqlite":
+            stmt = stmt.where(
+                models.Task.id.in_(
+                    select(models.tasks_fts.c.rowid).where(
+                        models.tasks_fts.c.title.match(fts_query(q))
+                    )
+                )
+            )
+        else:
+            stmt = stmt.where(models.Task.title.icontains(q, autoescape=True))
+
+    after_id = decode_cursor(cursor)
+    if after_id is not None:
+        stmt = stmt.where(models.Task.id > after_id)
+
+    stmt = stmt.order_by(models.Task.id).limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = list(result.all())
+
+    page_cursor = next_cursor(rows, limit)
+
+    # Plain rows already match TaskOut (or the requested subset of it): skip
+    # ORM hydration and the response_model re-validation, and encode
+    # straight to JSON.
+    return ORJSONResponse(
+        {"items": rows_to_dicts(rows), "next_cursor": page_cursor},
+        headers={"ETag": etag},
+    )
+
+
+@router.get("/stats", response_model=TaskStats)
+async def task_stats(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+):
+    result = await db.execute(
+        select(models.TaskCounter.total, models.TaskCounter.completed).where(
+            models.TaskCounter.user_id == current_user.id
+        )
+    )
+    total, completed = result.one_or_none() or (0, 0)
+
+    return TaskStats(total=total, completed=completed, open=total - completed)
+
+
+def select_changes(user_id: int, version: int, after_id: int):
+    """Live tasks and tombstones after position (``version``, ``after_id``)
+    in (version, id) order, oldest first; each side is a (user_id, version)
+    index range."""
+    task, tombstone = models.Task, models.TaskTombstone
+    live = select(
+        task.id,
+        task.version,
+        literal(False).label("deleted"),
+        task.title,
+        task.is_completed,
+    ).where(
+        task.user_id == user_id,
+        task.version >= version,
+        or_(task.version > version, task.id > after_id),
+    )
+    gone = select(
+        tombstone.task_id, tombstone.version, literal(True), null(), null()
+    ).where(
+        tombstone.user_id == user_id,
+        tombstone.version >= version,
+        or_(tombstone.version > version, tombstone.task_id > after_id),
+    )
+
+    changes = union_all(live, gone).subquery()
+    return select(changes).order_by(changes.c.version, changes.c.id)
+
+
+def change_to_dict(row) -> dict:
+    if row.deleted:
+        return {"id": row.id, "version": row.version, "deleted": True}
+    return row._asdict()
+
+
+@router.get("/changes", response_model=TaskChanges)
+async def task_changes(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+    since: Annotated[int, Query(ge=0)] = 0,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = settings.page_default_limit,
+):
+    """Tasks created, updated or deleted after version ``since`` (or after
+    ``cursor``, which wins), oldest first. Call again with the returned
+    ``cursor`` while ``has_more``, and next time; ``since=0`` returns every
+    task."""
+    limit = clamp_limit(limit)
+
+    if cursor:
+        version, after_id = decode_change_cursor(cursor)
+        reached = version
+    else:
+        # Everything from the next version on; ids start at 1.
+        version, after_id = since + 1, 0
+        reached = since
+
+    # One write's rows share a version, and a bulk write or the migration's
+    # backfill can give thousands of rows the same one, so pages split on
+    # (version, id), not on version.
+    result = await db.execute(
+        select_changes(current_user.id, version, after_id).limit(limit + 1)
+    )
+    rows = list(result.all())
+    has_more = len(rows) > limit
+    del rows[limit:]
+
+    if rows:
+        version, after_id = rows[-1].version, rows[-1].id
+        reached = version
+
+    return ORJSONResponse(
+        {
+            "items": [change_to_dict(row) for row in rows],
+            "version": reached,
+            "cursor": encode_change_cursor(version, after_id),
+            "has_more": has_more,
+        }
+    )
+
+
+EXPORT_COLUMNS = ("id", "title", "is_completed", "user_id")
+
+
+def encode_ndjson(rows) -> str:
+    return "".join(json.dumps(dict(row._mapping)) + "\n" for row in rows)
+
+
+def encode_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+@router.get("/export")
+async def export_tasks(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+    export_format: Annotated[
+        Literal["ndjson", "csv"], Query(alias="format")
+    ] = "ndjson",
+):
+    stmt = (
+        select(*(getattr(models.Task, column) for column in EXPORT_COLUMNS))
+        .where(models.Task.user_id == current_user.id)
+        .order_by(models.Task.id)
+        .execution_options(yield_per=settings.export_batch_size)
+    )
+    # Server-side cursor: rows arrive in yield_per batches, never all at once.
+    result = await db.stream(stmt)
+
+    if export_format == "csv":
+        media_type = "text/csv"
+        header = encode_csv([EXPORT_COLUMNS])
+        encode = encode_csv
+    else:
+        media_type = "application/x-ndjson"
+        header = ""
+        encode = encode_ndjson
+
+    async def body():
+        if header:
+            yield header
+
+        async for partition in result.partitions():
+            yield encode(partition)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="tasks.{export_format}"'
+        },
+    )
+
+
+@router.get("/stream")
+async def stream_tasks(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+    last_event_id: Annotated[str | None, Header()] = None,
+):
+    """Server-Sent Events for the user's tasks: ``created``, ``updated`` and
+    ``deleted``, each carrying the affected tasks (ids only for deletes).
+    Event ids are the user's task revision. A client reconnecting with
+    Last-Event-ID gets what it missed replayed, or a ``reset`` event (refetch
+    GET /tasks) when this worker can no longer replay it."""
+    # Subscribe before reading the revision so no event falls in between.
+    subscription = broker.subscribe(current_user.id)
+
+    try:
+        # The revision bounds the replay, so read it from the primary (or the
+        # user's shard), never from a possibly lagging replica.
+        sessionmaker = task_sessionmaker(current_user.id) or database.SessionLocal
+        async with sessionmaker() as session:
+            revision = await session.scalar(
+                select(models.TaskCounter.revision).where(
+                    models.TaskCounter.user_id == current_user.id
+                )
+            )
+        revision = revision or 0
+
+        # Otherwise get_current_user's session keeps a pooled connection for
+        # as long as the stream is open.
+        await db.close()
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+
+    backlog = []
+    after = 0
+    if last_event_id is not None:
+        after = revision
+        try:
+            missed = broker.replay(current_user.id, int(last_event_id), revision)
+        except ValueError:
+            missed = None
+        backlog = [Event(revision, "reset")] if missed is None else missed
+
+    async def events():
+        try:
+            for event in backlog:
+                yield event.encode()
+
+            while True:
+                try:
+                    event = await subscription.get(settings.sse_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+
+                if event is None:
+                    # Dropped for falling behind; the client reconnects and
+                    # resumes from its Last-Event-ID.
+                    return
+
+                # Already covered by the replay (or the reset).
+                if event.id > after:
+                    yield event.encode()
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("", response_model=TaskOut, status_code=status.HTTP_201_CREATED)
-def create_task(
-    current_user: Annotated[models.User, Depends(get_current_user)],
+async def create_task(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
     task: TaskCreate,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
 ):
-    db_task = models.Task(**task.model_dump(), user_id=current_user.id)
+    async def create(session: AsyncSession) -> tuple[int, models.Task]:
+        revision = await record_task_changes(session, current_user.id, total=1)
+        db_task = models.Task(
+            **task.model_dump(), user_id=current_user.id, version=revision
+        )
+        session.add(db_task)
+        await session.flush()
+        return revision, db_task
 
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    revision, db_task = await apply_write(db, current_user.id, create)
+    publish_task_event(current_user.id, revision, "created", [db_task])
 
     return db_task
 
 
-@router.patch("/{task_id}", response_model=TaskOut)
-def update_task(
-    current_user: Annotated[models.User, Depends(get_current_user)],
-    task_id: int,
-    task: TaskUpdate,
-    db: Annotated[Session, Depends(get_db)],
+@router.post(
+    "/bulk",
+    response_model=list[TaskBulkResult],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_tasks_bulk(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    tasks: list[TaskCreate],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
 ):
-    db_task = db.execute(
-        select(models.Task).where(
-            models.Task.id == task_id, models.Task.user_id == current_user.id
+    check_bulk_size(tasks)
+
+    if not tasks:
+        return []
+
+    revision = await record_task_changes(db, current_user.id, total=len(tasks))
+
+    # One INSERT ... VALUES (...), (...) RETURNING. RETURNING order isn't
+    # guaranteed, but ids are assigned in VALUES order, so sorting by id
+    # restores input order.
+    stmt = (
+        insert(models.Task)
+        .values(
+            [
+                {**task.model_dump(), "user_id": current_user.id, "version": revision}
+                for task in tasks
+            ]
         )
-    ).scalar_one_or_none()
+        .returning(*columns_for(models.Task, TaskOut))
+    )
+    result = await db.execute(stmt)
+    created = sorted(result.all(), key=lambda row: row.id)
+    await db.commit()
+    publish_task_event(current_user.id, revision, "created", created)
 
-    if db_task is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+    return [
+        {"id": row.id, "status": status.HTTP_201_CREATED, "task": row._asdict()}
+        for row in created
+    ]
+
+
+@router.patch("/bulk", response_model=list[TaskBulkResult])
+async def update_tasks_bulk(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    tasks: list[TaskBulkUpdate],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+):
+    check_bulk_size(tasks)
+
+    if not tasks:
+        return []
+
+    # Ownership is checked for the whole batch in one user_id-scoped query.
+    result = await db.execute(
+        select(*columns_for(models.Task, TaskOut)).where(
+            models.Task.user_id == current_user.id,
+            models.Task.id.in_({task.id for task in tasks}),
+        )
+    )
+    owned = {row.id: row._asdict() for row in result}
+
+    results = []
+    changed = {}
+    completed = 0
+    for task in tasks:
+        current = changed.get(task.id) or owned.get(task.id)
+
+        if current is None:
+            results.append(
+                {
+                    "id": task.id,
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "detail": "Task not found",
+                }
+            )
+            continue
+
+        update_data = task.model_dump(exclude_unset=True, exclude={"id"})
+        nulls = [key for key, value in update_data.items() if value is None]
+
+        if nulls:
+            # Only this item fails; the NOT NULL columns would otherwise
+            # fail the whole batch UPDATE.
+            results.append(
+                {
+                    "id": task.id,
+                    "status": status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    "detail": f"{', '.join(nulls)} cannot be null",
+                }
+            )
+            continue
+
+        updated = {**current, **update_data}
+        completed += completed_delta(current["is_completed"], updated["is_completed"])
+        changed[task.id] = updated
+        results.append({"id": task.id, "status": status.HTTP_200_OK, "task": updated})
+
+    revision = None
+    if changed:
+        revision = await record_task_changes(db, current_user.id, completed=completed)
+        # Every row gets the same columns, whichever fields its item set, so
+        # this is a single executemany UPDATE keyed on id.
+        await db.execute(
+            update(models.Task),
+            [
+                {
+                    "id": task["id"],
+                    "title": task["title"],
+                    "is_completed": task["is_completed"],
+                    "version": revision,
+                }
+                for task in changed.values()
+            ],
+        )
+
+    await db.commit()
+
+    if revision is not None:
+        publish_task_event(current_user.id, revision, "updated", list(changed.values()))
+
+    return results
+
+
+@router.delete("/bulk", response_model=list[TaskBulkResult])
+async def delete_tasks_bulk(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    body: TaskBulkDelete,
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+):
+    check_bulk_size(body.ids)
+
+    if not body.ids:
+        return []
+
+    result = await db.execute(
+        delete(models.Task)
+        .where(
+            models.Task.user_id == current_user.id,
+            models.Task.id.in_(set(body.ids)),
         )
+        .returning(models.Task.id, models.Task.is_completed)
+    )
+    deleted = dict(result.tuples().all())
+
+    revision = None
+    if deleted:
+        revision = await record_task_changes(
+            db,
+            current_user.id,
+            total=-len(deleted),
+            completed=-sum(deleted.values()),
+        )
+        await db.execute(
+            insert(models.TaskTombstone),
+            [
+                {"task_id": task_id, "user_id": current_user.id, "version": revision}
+                for task_id in deleted
+            ],
+        )
+
+    await db.commit()
 
+    if revision is not None:
+        publish_task_event(current_user.id, revision, "deleted", list(deleted))
+
+    return [
+        (
+            {"id": task_id, "status": status.HTTP_204_NO_CONTENT}
+            if task_id in deleted
+            else {
+                "id": task_id,
+                "status": status.HTTP_404_NOT_FOUND,
+                "detail": "Task not found",
+            }
+        )
+        for task_id in body.ids
+    ]
+
+
+@router.patch("/{task_id}", response_model=TaskOut)
+async def update_task(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
+    task_id: int,
+    task: TaskUpdate,
+    db: Annotated[AsyncSession, Depends(get_task_db)],
+):
     update_data = task.model_dump(exclude_unset=True)
 
-    for key, value in update_data.items():
-        setattr(db_task, key, value)
+    async def update_one(session: AsyncSession) -> tuple[int | None, models.Task]:
+        db_task = await get_owned_task(session, current_user.id, task_id)
+        was_completed = db_task.is_completed
+        revision = None
+
+        for key, value in update_data.items():
+            setattr(db_task, key, value)
 
-    db.commit()
-    db.refresh(db_task)
+        if update_data:
+            revision = await record_task_changes(
+                session,
+                current_user.id,
+                completed=completed_delta(was_completed, db_task.is_completed),
+            )
+            db_task.version = revision
+            await session.flush()
+
+        return revision, db_task
+
+    revision, db_task = await apply_write(db, current_user.id, update_one)
+
+    if revision is not None:
+        publish_task_event(current_user.id, revision, "updated", [db_task])
 
     return db_task
 
 
 @router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_task(
-    current_user: Annotated[models.User, Depends(get_current_user)],
+async def delete_task(
+    current_user: Annotated[CurrentUser, Depends(get_current_user)],
     task_id: int,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_task_db)],
 ):
-    db_task = db.execute(
-        select(models.Task).where(
-            models.Task.id == task_id, models.Task.user_id == current_user.id
+    async def delete_one(session: AsyncSession) -> int:
+        db_task = await get_owned_task(session, current_user.id, task_id)
+        await session.delete(db_task)
+        revision = await record_task_changes(
+            session, current_user.id, total=-1, completed=-int(db_task.is_completed)
         )
-    ).scalar_one_or_none()
-
-    if db_task is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        session.add(
+            models.TaskTombstone(
+                task_id=task_id, user_id=current_user.id, version=revision
+            )
         )
+        await session.flush()
+        return revision
 
-    db.delete(db_task)
-    db.commit()
+    revision = await apply_write(db, current_user.id, delete_one)
+    publish_task_event(current_user.id, revision, "deleted", [task_id])
 
     return None
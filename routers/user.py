@@ -1,46 +1,228 @@
 # routers.user.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import Annotated
-from schemas import UserOut, UserCreate
-from database import get_db
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, select, update
+from collections import defaultdict
+from typing import Annotated, Literal
+from schemas import Page, UserOut, UserWithTaskCounts
+from database import get_db, is_sharded, task_sessionmaker
+from security import invalidate_user
+from purge import schedule_purge
+from pagination import clamp_limit, decode_cursor, next_cursor
+from etag import etag_matches, make_etag, not_modified
+from projection import columns_for, parse_fields, rows_to_dicts
+from config import settings
 import models
 
 router = APIRouter()
 
 
-@router.get("", response_model=list[UserOut])
-def list_users(db: Annotated[Session, Depends(get_db)]):
-    db_users = db.execute(select(models.User)).scalars().all()
+async def clear_task_data(task_db: AsyncSession, user_id: int) -> None:
+    await task_db.execute(delete(models.Task).where(models.Task.user_id == user_id))
+    await task_db.execute(
+        delete(models.TaskCounter).where(models.TaskCounter.user_id == user_id)
+    )
+    await task_db.execute(
+        delete(models.TaskTombstone).where(models.TaskTombstone.user_id == user_id)
+    )
 
-    return db_users
+
+Include = Literal["task_counts"]
+
+
+def select_users(include: Include | None, fields: list[str] | None = None):
+    # Users being purged in the background are already gone as far as the
+    # API is concerned.
+    stmt = select(*columns_for(models.User, UserOut, fields)).where(
+        models.User.deleted_at.is_(None)
+    )
+
+    # Counters sit next to users unless sharded: one LEFT JOIN, no per-user
+    # lookups.
+    if include == "task_counts" and not is_sharded():
+        counter = models.TaskCounter
+        stmt = stmt.add_columns(
+            func.coalesce(counter.total, 0).label("task_total"),
+            func.coalesce(counter.completed, 0).label("task_completed"),
+        ).outerjoin(counter, counter.user_id == models.User.id)
+
+    return stmt
+
+
+async def add_shard_task_counts(users: list[dict]) -> None:
+    """Fill task_total/task_completed from the shards: one IN query per
+    shard holding any of ``users``."""
+    ids_by_shard = defaultdict(list)
+    for user in users:
+        ids_by_shard[task_sessionmaker(user["id"])].append(user["id"])
+
+    counter = models.TaskCounter
+    counts = {}
+    for sessionmaker, user_ids in ids_by_shard.items():
+        async with sessionmaker() as task_db:
+            result = await task_db.execute(
+                select(counter.user_id, counter.total, counter.completed).where(
+                    counter.user_id.in_(user_ids)
+                )
+            )
+            counts.update({user_id: (total, done) for user_id, total, done in result})
+
+    for user in users:
+        user["task_total"], user["task_completed"] = counts.get(user["id"], (0, 0))
+
+
+async def users_to_dicts(rows, include: Include | None) -> list[dict]:
+    users = rows_to_dicts(rows)
+
+    if include == "task_counts" and is_sharded():
+        await add_shard_task_counts(users)
+
+    return users
+
+
+@router.get("", response_model=Page[UserOut] | Page[UserWithTaskCounts])
+async def list_users(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1)] = settings.page_default_limit,
+    include: Include | None = None,
+    fields: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    limit = clamp_limit(limit)
+    stmt = select_users(include, parse_fields(fields, UserOut))
+
+    after_id = decode_cursor(cursor)
+    if after_id is not None:
+        stmt = stmt.where(models.User.id > after_id)
+
+    stmt = stmt.order_by(models.User.id).limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = list(result.all())
+
+    page_cursor = next_cursor(rows, limit)
+    items = await users_to_dicts(rows, include)
+
+    # Users have no mutable fields, so the page contents (task counts
+    # included) are their revision.
+    etag = make_etag("users", page_cursor, items)
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    return ORJSONResponse(
+        {"items": items, "next_cursor": page_cursor}, headers={"ETag": etag}
+    )
+
+
+@router.get("/batch", response_model=list[UserOut] | list[UserWithTaskCounts])
+async def get_users_batch(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    ids: Annotated[list[str], Query(min_length=1)],
+    include: Include | None = None,
+):
+    """Resolve many users in one IN query: ``?ids=1,2,3`` or ``?ids=1&ids=2``.
+    Users come back in request order; unknown ids are left out."""
+    try:
+        user_ids = list(
+            dict.fromkeys(int(part) for value in ids for part in value.split(","))
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="ids must be integers",
+        )
+
+    if len(user_ids) > settings.bulk_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"At most {settings.bulk_max_items} ids per batch",
+        )
+
+    result = await db.execute(select_users(include).where(models.User.id.in_(user_ids)))
+    users = {user["id"]: user for user in await users_to_dicts(result.all(), include)}
+
+    return ORJSONResponse([users[user_id] for user_id in user_ids if user_id in users])
 
 
 @router.get("/{user_id}", response_model=UserOut)
-def get_user_by_id(user_id: int, db: Annotated[Session, Depends(get_db)]):
-    db_user = db.execute(
-        select(models.User).where(models.User.id == user_id)
-    ).scalar_one_or_none()
+async def get_user_by_id(
+    user_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    fields: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    stmt = select_users(None, parse_fields(fields, UserOut))
+    result = await db.execute(stmt.where(models.User.id == user_id))
+    row = result.one_or_none()
 
-    if db_user is None:
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    return db_user
 
+    user = row._asdict()
+    etag = make_etag("user", user)
+
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Annotated[Session, Depends(get_db)]):
-    db_user = db.execute(
-        select(models.User).where(models.User.id == user_id)
-    ).scalar_one_or_none()
+    return ORJSONResponse(user, headers={"ETag": etag})
 
-    if db_user is None:
+
+@router.delete(
+    "/{user_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={status.HTTP_202_ACCEPTED: {"description": "Purge scheduled"}},
+)
+async def delete_user(
+    user_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    background: bool = False,
+):
+    """Delete a user and their tasks. With ``background=true`` the user is
+    hidden at once (202) and their tasks are purged in chunks afterwards."""
+    result = await db.execute(
+        select(models.User.id).where(
+            models.User.id == user_id, models.User.deleted_at.is_(None)
+        )
+    )
+
+    if result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    db.delete(db_user)
-    db.commit()
+    if background:
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == user_id)
+            .values(deleted_at=func.now())
+        )
+        await db.commit()
+        invalidate_user(user_id)
+        schedule_purge(user_id)
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+
+    # A shard can't cascade from the central users table, so clear it first.
+    sessionmaker = task_sessionmaker(user_id)
+    if sessionmaker is not None:
+        async with sessionmaker() as task_db:
+            await clear_task_data(task_db, user_id)
+            await task_db.commit()
+
+    # Unsharded, ON DELETE CASCADE removes the tasks and counters in the same
+    # statement; nothing is loaded into the session.
+    await db.execute(delete(models.User).where(models.User.id == user_id))
+    await db.commit()
+    invalidate_user(user_id)
     return None
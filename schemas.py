@@ -1,6 +1,9 @@
 # schemas.py
+from typing import Generic, TypeVar
 from pydantic import BaseModel, EmailStr, ConfigDict
 
+T = TypeVar("T")
+
 
 class UserBase(BaseModel):
     username: str
@@ -17,6 +20,11 @@ class UserOut(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserWithTaskCounts(UserOut):
+    task_total: int
+    task_completed: int
+
+
 class TaskBase(BaseModel):
     title: str
 
@@ -38,6 +46,50 @@ class TaskOut(TaskBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class TaskStats(BaseModel):
+    total: int
+    completed: int
+    open: int
+
+
+class TaskChange(BaseModel):
+    id: int
+    version: int
+    deleted: bool = False
+    # Left out for deleted tasks
+    title: str | None = None
+    is_completed: bool | None = None
+
+
+class TaskChanges(BaseModel):
+    items: list[TaskChange]
+    # Highest version seen so far
+    version: int
+    # Pass back as ?cursor= for the next call
+    cursor: str
+    has_more: bool
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+
+class TaskBulkDelete(BaseModel):
+    ids: list[int]
+
+
+class TaskBulkResult(BaseModel):
+    id: int | None = None
+    status: int
+    task: TaskOut | None = None
+    detail: str | None = None
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
@@ -1,29 +1,148 @@
 # security.py
 from pwdlib import PasswordHash
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+import time
 from config import settings
 import jwt
 from jwt.exceptions import InvalidTokenError
 from typing import Annotated
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import models
-from database import get_db
+from cache import TTLCache
+from metrics import (
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_SECONDS,
+    PASSWORD_HASH_WAIT_SECONDS,
+)
+from database import READ_METHODS, get_db
 
 
-ph = PasswordHash.recommended()
+_password_hasher: PasswordHash | None = None
+
+
+def get_password_hasher() -> PasswordHash:
+    global _password_hasher
+
+    if _password_hasher is None:
+        _password_hasher = PasswordHash.recommended()
+
+    return _password_hasher
+
 
 oauth_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def hash_password(plain_password: str) -> str:
-    return ph.hash(plain_password)
+@dataclass(frozen=True, slots=True)
+class CurrentUser:
+    """Identity of the authenticated caller, detached from any DB session."""
+
+    id: int
+    username: str
+
+
+# Maps a raw bearer token to its CurrentUser so repeat requests skip both
+# jwt.decode and the users lookup. Each worker has its own: invalidate_user()
+# only clears this process's, so writes re-check that the user still exists
+# and other workers keep serving a deleted user's reads for at most
+# TOKEN_CACHE_TTL_SECONDS.
+token_cache = TTLCache(maxsize=settings.token_cache_size)
+
+
+def invalidate_user(user_id: int) -> None:
+    token_cache.discard_where(lambda cached: cached.id == user_id)
+
+
+async def user_is_active(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(
+        select(models.User.id).where(
+            models.User.id == user_id, models.User.deleted_at.is_(None)
+        )
+    )
+    return result.scalar_one_or_none() is not None
+
+
+_hash_executor: Executor | None = None
+_hash_pending = 0
+
+
+def get_hash_executor() -> Executor:
+    global _hash_executor
+
+    if _hash_executor is None:
+        if settings.hash_executor == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=settings.hash_workers)
+        else:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.hash_workers, thread_name_prefix="argon2"
+            )
+
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
+# Module-level so they can be pickled into a ProcessPoolExecutor.
+def _hash(plain_password: str) -> str:
+    return get_password_hasher().hash(plain_password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return ph.verify(plain_password, hashed_password)
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return get_password_hasher().verify(plain_password, hashed_password)
+
+
+def _timed(fn, *args):
+    # Runs in the worker, so the duration excludes time spent queued.
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+async def _run_hashing(operation: str, fn, *args):
+    global _hash_pending
+
+    if _hash_pending >= settings.hash_workers + settings.hash_queue_size:
+        PASSWORD_HASH_REJECTED.labels(operation).inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again shortly",
+            headers={"Retry-After": str(settings.hash_retry_after_seconds)},
+        )
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        result, compute_seconds = await loop.run_in_executor(
+            get_hash_executor(), _timed, fn, *args
+        )
+    finally:
+        _hash_pending -= 1
+
+    PASSWORD_HASH_SECONDS.labels(operation).observe(compute_seconds)
+    PASSWORD_HASH_WAIT_SECONDS.labels(operation).observe(
+        max(0.0, time.perf_counter() - started - compute_seconds)
+    )
+    return result
+
+
+async def hash_password(plain_password: str) -> str:
+    return await _run_hashing("hash", _hash, plain_password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing("verify", _verify, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expire_delta: timedelta | None = None) -> str:
@@ -45,16 +164,29 @@ def create_access_token(data: dict, expire_delta: timedelta | None = None) -> st
     return encoded_token
 
 
-def get_current_user(
+async def get_current_user(
+    request: Request,
     token: Annotated[str, Depends(oauth_scheme)],
-    db: Annotated[Session, Depends(get_db)],
-):
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> CurrentUser:
     credential_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    cached_user = token_cache.get(token)
+
+    if cached_user is not None:
+        # The user may have been deleted through another worker. A write
+        # would then fail on the users foreign key (or, on a shard, succeed
+        # for a user that is gone), so writes check first.
+        if request.method in READ_METHODS or await user_is_active(db, cached_user.id):
+            return cached_user
+
+        invalidate_user(cached_user.id)
+        raise credential_exception
+
     try:
         payload = jwt.decode(
             token, settings.secret_key, algorithms=[settings.algorithm]
@@ -67,11 +199,24 @@ def get_current_user(
     except InvalidTokenError:
         raise credential_exception
 
-    stmt = select(models.User).where(models.User.username == username)
+    stmt = select(models.User).where(
+        models.User.username == username, models.User.deleted_at.is_(None)
+    )
+
+    result = await db.execute(stmt)
 
-    db_user = db.execute(stmt).scalar_one_or_none()
+    db_user = result.scalar_one_or_none()
 
     if db_user is None:
         raise credential_exception
 
-    return db_user
+    current_user = CurrentUser(id=db_user.id, username=db_user.username)
+
+    # Never outlive the token itself.
+    expires_at = time.time() + settings.token_cache_ttl_seconds
+    if payload.get("exp") is not None:
+        expires_at = min(expires_at, payload["exp"])
+
+    token_cache.set(token, current_user, expires_at)
+
+    return current_user
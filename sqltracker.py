@@ -0,0 +1,99 @@
+# sqltracker.py
+"""Request-scoped SQL tracking: statement counts and DB time, slow-query
+logging and repeated-statement (N+1) detection."""
+
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryTracker:
+    label: str = ""
+    queries: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.seconds += elapsed
+        self.statements[statement] += 1
+
+        if self.statements[statement] == settings.repeated_query_threshold:
+            logger.warning(
+                "Possible N+1 in %s: statement ran %d times: %s",
+                self.label or "request",
+                settings.repeated_query_threshold,
+                statement,
+            )
+
+
+current_tracker: ContextVar[QueryTracker | None] = ContextVar(
+    "current_tracker", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, not the connection: a statement that
+    # raises never reaches after_cursor_execute and would leave it behind.
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+
+    elapsed = time.perf_counter() - started
+
+    # Parameters are left out on purpose: they include password hashes.
+    if elapsed * 1000 >= settings.slow_query_ms:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+    tracker = current_tracker.get()
+    if tracker is not None:
+        tracker.record(statement, elapsed)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryTrackingMiddleware:
+    """Gives every HTTP request its own QueryTracker. In debug mode the
+    totals so far are sent back as X-DB-Queries / X-DB-Time headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker(label=f"{scope['method']} {scope['path']}")
+        token = current_tracker.set(tracker)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.debug:
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (b"x-db-queries", str(tracker.queries).encode()),
+                    (b"x-db-time", f"{tracker.seconds * 1000:.3f}ms".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_tracker.reset(token)
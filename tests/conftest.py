@@ -1,47 +1,51 @@
 # tests/conftest.py
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-from fastapi.testclient import TestClient
-from database import Base, get_db
-from main import app
-
-# In-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+from config import Settings, configure
 
-test_engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+# Settings are fixed before anything that reads them is imported, so the app
+# is built for the tests instead of being patched afterwards.
+configure(
+    Settings(
+        secret_key="test-secret",
+        algorithm="HS256",
+        # In-memory SQLite always gets one shared connection (StaticPool).
+        database_url="sqlite+aiosqlite:///:memory:",
+        task_shard_urls=[],
+        access_token_expires_minutes=30,
+    )
 )
 
+from fastapi.testclient import TestClient
+from config import settings
+from database import Base
+from main import create_app
+from security import token_cache
+import database
 
-TestingSessionLocal = sessionmaker(
-    bind=test_engine, expire_on_commit=False, autoflush=False
-)
+app = create_app()
 
 
-# Override get_db to use test database
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def create_tables():
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 
-app.dependency_overrides[get_db] = override_get_db
+async def drop_tables():
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
 
 
 @pytest.fixture(scope="module")
 def test_client():
-    # Create all tables
-    Base.metadata.create_all(bind=test_engine)
-    client = TestClient(app)
-    yield client
-    # Drop tables after tests
-    Base.metadata.drop_all(bind=test_engine)
+    # One event loop per module, shared by every request and the table setup
+    with TestClient(app) as client:
+        # Create all tables
+        client.portal.call(create_tables)
+        token_cache.clear()
+        yield client
+        # Drop tables after tests
+        client.portal.call(drop_tables)
+        token_cache.clear()
 
 
 @pytest.fixture
@@ -57,8 +61,49 @@ def create_test_user(test_client):
     # If user already exists, fetch the user instead
     if response.status_code == 409:  # Conflict
         users_response = test_client.get("/users")
-        user = next(u for u in users_response.json() if u["username"] == "alice")
+        user = next(
+            u for u in users_response.json()["items"] if u["username"] == "alice"
+        )
     else:
         user = response.json()
 
     return user
+
+
+@pytest.fixture
+def query_budget(monkeypatch):
+    """Returns check(response, max_queries): fails when the request ran more
+    SQL statements than its budget. Reads the debug X-DB-Queries header."""
+    monkeypatch.setattr(settings, "debug", True)
+
+    def check(response, max_queries: int) -> None:
+        queries = int(response.headers["X-DB-Queries"])
+        request = response.request
+        assert queries <= max_queries, (
+            f"{request.method} {request.url.path} ran {queries} queries,"
+            f" budget is {max_queries}"
+        )
+
+    return check
+
+
+@pytest.fixture
+def login_headers(test_client):
+    """Returns headers(username): registers the user (password "pw") unless
+    they exist, logs in and returns the bearer Authorization header."""
+
+    def headers(username: str) -> dict:
+        test_client.post(
+            "/auth/register",
+            json={
+                "username": username,
+                "email": f"{username}@example.com",
+                "password": "pw",
+            },
+        )
+        token = test_client.post(
+            "/auth/login", data={"username": username, "password": "pw"}
+        ).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
@@ -0,0 +1,73 @@
+# tests/test_admission.py
+import asyncio
+from fastapi import status
+from admission import ConcurrencyLimiter, TokenBucket, route_group
+import admission
+
+
+def test_limiter_queues_then_sheds():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=0.05)
+        assert await limiter.acquire() is None
+
+        # One caller may wait; the next is shed immediately.
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert await limiter.acquire() == "queue_full"
+
+        # The queued caller gives up at its deadline.
+        assert await waiting == "timeout"
+        assert limiter.active == 1 and not limiter._waiters
+
+        # A released slot goes to the next waiter, not a newcomer.
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        assert await waiting is None
+        assert limiter.active == 1
+
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_route_group_matches_prefixes():
+    groups = {"/auth": 1, "/tasks": 1}
+    assert route_group("/tasks", groups) == "/tasks"
+    assert route_group("/tasks/bulk", groups) == "/tasks"
+    assert route_group("/tasksx", groups) is None
+    assert route_group("/health", groups) is None
+
+    # The most specific prefix wins, whatever the order.
+    groups = {"/tasks": 1, "/tasks/stream": 1}
+    assert route_group("/tasks/stream", groups) == "/tasks/stream"
+    assert route_group("/tasks/1", groups) == "/tasks"
+
+
+def test_token_bucket_refills():
+    now = [0.0]
+    bucket = TokenBucket(rate=1.0, burst=2, maxsize=10, clock=lambda: now[0])
+
+    assert bucket.take("alice") == 0
+    assert bucket.take("alice") == 0
+    assert bucket.take("alice") == 1.0
+    assert bucket.take("bob") == 0
+
+    now[0] += 1
+    assert bucket.take("alice") == 0
+
+
+def test_tasks_rate_limited_per_user(test_client, login_headers, monkeypatch):
+    monkeypatch.setattr(
+        admission, "rate_limiter", TokenBucket(rate=0.5, burst=2, maxsize=10)
+    )
+    headers = login_headers("dave")
+
+    for _ in range(2):
+        assert test_client.get("/tasks", headers=headers).status_code == 200
+
+    response = test_client.get("/tasks", headers=headers)
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert response.headers["Retry-After"] == "2"
+    assert "rate_limited_total" in test_client.get("/metrics").text
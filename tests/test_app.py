@@ -0,0 +1,19 @@
+# tests/test_app.py
+from fastapi.testclient import TestClient
+from config import settings
+from main import create_app
+import database
+
+
+def test_lifespan_builds_engines_and_openapi(monkeypatch):
+    monkeypatch.setattr(settings, "openapi_precompute", True)
+    app = create_app()
+    assert app.openapi_schema is None
+
+    with TestClient(app) as client:
+        assert database.engine is not None
+        assert app.openapi_schema is not None
+        assert client.get("/health").status_code == 200
+
+    # Shutdown disposes the engines so the next lifespan starts fresh.
+    assert database.engine is None
@@ -1,6 +1,9 @@
 # tests/test_auth.py
 import pytest
 from fastapi import status
+from manage import import_users
+import manage
+import security
 
 
 @pytest.mark.parametrize(
@@ -31,6 +34,60 @@ def test_register_duplicate_user(test_client):
     assert response.status_code == status.HTTP_409_CONFLICT
 
 
+def test_register_is_one_statement(test_client, query_budget):
+    response = test_client.post(
+        "/auth/register",
+        json={"username": "solo", "email": "solo@example.com", "password": "pw"},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    query_budget(response, 1)
+
+    # Same email, different username: still the unique constraint's 409.
+    response = test_client.post(
+        "/auth/register",
+        json={"username": "solo2", "email": "solo@example.com", "password": "pw"},
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    query_budget(response, 1)
+
+
+def test_import_users(test_client, tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,email,password\n"
+        "imp1,imp1@example.com,secret1\n"
+        "imp2,imp2@example.com,secret2\n"
+        "imp1,other@example.com,dup-in-file\n"
+        "alice,new@example.com,exists-already\n"
+        "broken,not-an-email,x\n"
+    )
+
+    stats = test_client.portal.call(import_users, path, 2, 1)
+    assert stats == {"imported": 2, "skipped": 2, "invalid": 1}
+
+    response = test_client.post(
+        "/auth/login", data={"username": "imp2", "password": "secret2"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_import_skips_users_registered_meanwhile(test_client, tmp_path, monkeypatch):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,email,password\n"
+        "alice,race@example.com,secret\n"
+        "imp3,imp3@example.com,secret3\n"
+    )
+
+    # As if alice registered between the lookup and the insert.
+    async def nothing_taken(users):
+        return set(), set()
+
+    monkeypatch.setattr(manage, "taken_names", nothing_taken)
+    stats = test_client.portal.call(import_users, path, 10, 1)
+    assert stats == {"imported": 1, "skipped": 1, "invalid": 0}
+
+
 def test_login_user(test_client):
     response = test_client.post(
         "/auth/login",
@@ -48,3 +105,13 @@ def test_login_wrong_credentials(test_client):
         data={"username": "alice", "password": "wrongpassword"},
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_login_rejected_when_hash_queue_full(test_client, monkeypatch):
+    monkeypatch.setattr(security, "_hash_pending", 10_000)
+    response = test_client.post(
+        "/auth/login",
+        data={"username": "alice", "password": "password123"},
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert "Retry-After" in response.headers
@@ -0,0 +1,155 @@
+# tests/test_broker.py
+import asyncio
+import json
+import httpx
+import pytest
+from broker import Broker, Event
+from config import settings
+
+
+def test_replay_needs_every_missed_event():
+    broker = Broker()
+    for revision in (3, 4, 5):
+        broker.deliver(1, Event(revision, "updated"))
+
+    assert [event.id for event in broker.replay(1, 3, 5)] == [4, 5]
+    assert broker.replay(1, 5, 5) == []
+    # Revision 2 was never seen by this broker.
+    assert broker.replay(1, 1, 5) is None
+    assert broker.replay(2, 0, 1) is None
+
+
+def test_slow_subscriber_is_dropped(monkeypatch):
+    monkeypatch.setattr(settings, "sse_queue_size", 2)
+
+    async def scenario():
+        broker = Broker()
+        slow = broker.subscribe(1)
+        for revision in (1, 2, 3):
+            broker.deliver(1, Event(revision, "created"))
+
+        assert broker.subscriptions == {}
+        assert await slow.get(timeout=1) is None
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def auth_header(login_headers):
+    return login_headers("sse")
+
+
+def parse_events(body: bytes) -> list[dict]:
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if ": " in line
+        )
+        if "event" in fields:
+            events.append(
+                {
+                    "id": int(fields["id"]),
+                    "event": fields["event"],
+                    "data": json.loads(fields["data"]),
+                }
+            )
+    return events
+
+
+def read_stream(test_client, headers: dict, count: int, writes=None) -> list[dict]:
+    """Open GET /tasks/stream, run ``writes(client)`` once the response has
+    started, and disconnect after ``count`` events."""
+    app = test_client.app
+
+    async def scenario():
+        body = b""
+        started = asyncio.Event()
+        enough = asyncio.Event()
+
+        async def receive():
+            await enough.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal body
+            if message["type"] == "http.response.start":
+                assert message["status"] == 200
+                started.set()
+            elif message["type"] == "http.response.body":
+                body += message.get("body", b"")
+                if len(parse_events(body)) >= count:
+                    enough.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/tasks/stream",
+            "raw_path": b"/tasks/stream",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        stream = asyncio.create_task(app(scope, receive, send))
+
+        await asyncio.wait_for(started.wait(), 5)
+        if writes is not None:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://testserver"
+            ) as client:
+                await writes(client)
+
+        await asyncio.wait_for(enough.wait(), 5)
+        await asyncio.wait_for(stream, 5)
+        return parse_events(body)
+
+    return test_client.portal.call(scenario)
+
+
+def test_stream_pushes_task_changes(test_client, auth_header):
+    async def writes(client):
+        task = (
+            await client.post("/tasks", json={"title": "Live"}, headers=auth_header)
+        ).json()
+        await client.patch(
+            f"/tasks/{task['id']}", json={"is_completed": True}, headers=auth_header
+        )
+        await client.delete(f"/tasks/{task['id']}", headers=auth_header)
+
+    events = read_stream(test_client, auth_header, 3, writes)
+    assert [event["event"] for event in events] == ["created", "updated", "deleted"]
+    assert events[0]["data"][0]["title"] == "Live"
+    assert events[1]["data"][0]["is_completed"] is True
+    assert events[2]["data"] == [{"id": events[0]["data"][0]["id"]}]
+    assert [event["id"] for event in events] == list(
+        range(events[0]["id"], events[0]["id"] + 3)
+    )
+
+    # Reconnecting replays what came after Last-Event-ID...
+    resumed = read_stream(
+        test_client, {**auth_header, "Last-Event-ID": str(events[0]["id"])}, 2
+    )
+    assert resumed == events[1:]
+
+    # ...or tells the client to refetch when that isn't possible.
+    reset = read_stream(test_client, {**auth_header, "Last-Event-ID": "junk"}, 1)
+    assert reset == [{"id": events[-1]["id"], "event": "reset", "data": None}]
+
+
+def test_stream_survives_heartbeats(test_client, auth_header, monkeypatch):
+    monkeypatch.setattr(settings, "sse_heartbeat_seconds", 0.01)
+
+    async def writes(client):
+        await asyncio.sleep(0.05)
+        await client.post("/tasks", json={"title": "Later"}, headers=auth_header)
+
+    events = read_stream(test_client, auth_header, 1, writes)
+    assert events[0]["data"][0]["title"] == "Later"
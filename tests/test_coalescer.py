@@ -0,0 +1,153 @@
+# tests/test_coalescer.py
+import asyncio
+import pytest
+from fastapi import HTTPException, status
+from sqlalchemy import event, text
+from coalescer import WriteCoalescer
+from config import settings
+from database import build_engine, make_sessionmaker
+
+
+def test_concurrent_writes_share_one_commit(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "write_coalesce_window_ms", 50)
+
+    async def scenario():
+        engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("CREATE TABLE t (x INTEGER UNIQUE)")
+        commits.clear()
+
+        coalescer = WriteCoalescer(make_sessionmaker(engine))
+
+        def insert(x):
+            async def op(session):
+                await session.execute(text("INSERT INTO t VALUES (:x)"), {"x": x})
+                return x
+
+            return op
+
+        async def not_found(session):
+            raise HTTPException(status_code=404)
+
+        results = await asyncio.gather(
+            coalescer.submit(insert(1)),
+            coalescer.submit(insert(2)),
+            coalescer.submit(insert(1)),  # unique violation, rolled back alone
+            coalescer.submit(not_found),
+            coalescer.submit(insert(3)),
+            return_exceptions=True,
+        )
+
+        async with engine.connect() as conn:
+            rows = (await conn.exec_driver_sql("SELECT x FROM t ORDER BY x")).all()
+        await engine.dispose()
+        return results, rows, len(commits)
+
+    results, rows, commits = asyncio.run(scenario())
+
+    assert results[0] == 1 and results[1] == 2 and results[4] == 3
+    assert "UNIQUE" in str(results[2])
+    assert isinstance(results[3], HTTPException)
+    assert [x for (x,) in rows] == [1, 2, 3]
+    assert commits == 1
+
+
+def test_abandoned_write_does_not_fail_the_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "write_coalesce_window_ms", 50)
+
+    async def scenario():
+        engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+
+        coalescer = WriteCoalescer(make_sessionmaker(engine))
+        ran = []
+
+        async def good(session):
+            await session.execute(text("INSERT INTO t VALUES (1)"))
+            return 1
+
+        async def not_found(session):
+            ran.append(1)
+            raise HTTPException(status_code=404)
+
+        ok = asyncio.create_task(coalescer.submit(good))
+        abandoned = asyncio.create_task(coalescer.submit(not_found))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+
+        results = await asyncio.gather(ok, abandoned, return_exceptions=True)
+        await engine.dispose()
+        return results, ran
+
+    results, ran = asyncio.run(scenario())
+
+    assert results[0] == 1
+    assert isinstance(results[1], asyncio.CancelledError)
+    # The cancelled caller's op is skipped, not run.
+    assert ran == []
+
+
+def test_waiting_writes_fail_when_flusher_dies(monkeypatch):
+    monkeypatch.setattr(settings, "write_coalesce_window_ms", 10)
+
+    async def op(session):
+        return 1
+
+    async def scenario():
+        coalescer = WriteCoalescer(
+            make_sessionmaker(build_engine("sqlite+aiosqlite://"))
+        )
+
+        async def broken(batch):
+            raise RuntimeError("flush failed")
+
+        monkeypatch.setattr(coalescer, "flush", broken)
+        failed = await asyncio.gather(coalescer.submit(op), return_exceptions=True)
+
+        waiting = asyncio.create_task(coalescer.submit(op))
+        await asyncio.sleep(0)
+        for flusher in coalescer._flushers:
+            flusher.cancel()
+        cancelled = await asyncio.gather(waiting, return_exceptions=True)
+        return failed[0], cancelled[0]
+
+    failed, cancelled = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert str(failed) == "flush failed"
+    assert isinstance(cancelled, asyncio.CancelledError)
+
+
+@pytest.fixture
+def auth_header(login_headers):
+    return login_headers("gc")
+
+
+def test_task_writes_with_coalescing(test_client, auth_header, monkeypatch):
+    monkeypatch.setattr(settings, "write_coalescing", True)
+
+    response = test_client.post(
+        "/tasks", json={"title": "Grouped"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    task = response.json()
+    assert task["is_completed"] is False
+
+    response = test_client.patch(
+        f"/tasks/{task['id']}", json={"is_completed": True}, headers=auth_header
+    )
+    assert response.json()["is_completed"] is True
+    assert test_client.get("/tasks/stats", headers=auth_header).json() == {
+        "total": 1,
+        "completed": 1,
+        "open": 0,
+    }
+
+    response = test_client.delete(f"/tasks/{task['id']}", headers=auth_header)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = test_client.delete(f"/tasks/{task['id']}", headers=auth_header)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert "write_coalescer_batch_size_count" in test_client.get("/metrics").text
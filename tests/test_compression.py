@@ -0,0 +1,75 @@
+# tests/test_compression.py
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from compression import CompressionMiddleware, accepted_encodings
+
+BODY = "task " * 1000
+
+
+def make_client(encodings: list[str]) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, encodings=encodings, minimum_size=500)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BODY)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("tiny")
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter([BODY]), media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, GZIP;q=0.5") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+
+def test_gzip_above_minimum_size():
+    client = make_client(["gzip"])
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == BODY
+    assert int(response.headers["content-length"]) < len(BODY) // 10
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_event_streams_are_not_compressed():
+    client = make_client(["gzip"])
+    response = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == BODY
+
+
+def test_brotli_preferred_when_installed():
+    pytest.importorskip("brotli")
+    client = make_client(["br", "gzip"])
+
+    # httpx decodes brotli itself when the package is installed.
+    response = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == BODY
+
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_app_compresses_responses(test_client):
+    response = test_client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["paths"]
+    assert "fields" in str(response.json()["paths"]["/tasks"])
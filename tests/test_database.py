@@ -0,0 +1,50 @@
+# tests/test_database.py
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from database import build_engine, engine_options
+
+
+def test_memory_sqlite_shares_one_connection():
+    options = engine_options("sqlite+aiosqlite:///:memory:")
+    assert options["poolclass"] is StaticPool
+    assert "pool_size" not in options
+
+
+def test_file_sqlite_pool_and_pragmas(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"
+    assert engine_options(url)["poolclass"] is AsyncAdaptedQueuePool
+    assert not engine_options(url)["pool_pre_ping"]
+    assert engine_options("postgresql+asyncpg://db/app")["pool_pre_ping"]
+
+    async def read_pragmas():
+        engine = build_engine(url)
+        try:
+            async with engine.connect() as conn:
+                return {
+                    name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                    for name in ("journal_mode", "synchronous", "busy_timeout")
+                }
+        finally:
+            await engine.dispose()
+
+    pragmas = asyncio.run(read_pragmas())
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1  # NORMAL
+    assert pragmas["busy_timeout"] == 5000
+
+
+def test_foreign_keys_only_where_requested(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"
+
+    async def foreign_keys(enabled):
+        engine = build_engine(url, foreign_keys=enabled)
+        try:
+            async with engine.connect() as conn:
+                return (await conn.execute(text("PRAGMA foreign_keys"))).scalar()
+        finally:
+            await engine.dispose()
+
+    # The main database cascades user deletes; shards are built without it.
+    assert asyncio.run(foreign_keys(True)) == 1
+    assert asyncio.run(foreign_keys(False)) == 0
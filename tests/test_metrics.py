@@ -0,0 +1,25 @@
+# tests/test_metrics.py
+from fastapi import status
+
+
+def test_metrics_exposes_route_and_db_timings(test_client, create_test_user):
+    test_client.get(f"/users/{create_test_user['id']}")
+
+    response = test_client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+
+    body = response.text
+    assert (
+        'http_requests_total{method="GET",route="/users/{user_id}",status="200"}'
+        in body
+    )
+    assert 'db_queries_per_request_count{route="/users/{user_id}"}' in body
+    assert 'password_hash_seconds_count{operation="hash"}' in body
+    assert "http_requests_in_flight" in body
+
+
+def test_metrics_unmatched_route_label(test_client):
+    test_client.get("/no-such-route")
+    body = test_client.get("/metrics").text
+    assert 'route="<unmatched>",status="404"' in body
@@ -0,0 +1,127 @@
+# tests/test_replicas.py
+import asyncio
+import sqlite3
+import pytest
+from fastapi.testclient import TestClient
+from config import settings
+from database import Base, build_engine
+from main import create_app
+import database
+
+
+BOB = {"username": "bob", "email": "bob@example.com", "password": "pw"}
+
+
+def add_user(path, username):
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO users (username, email, hashed_password) VALUES (?, ?, '-')",
+            (username, f"{username}@example.com"),
+        )
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """A primary and a read-only replica, both SQLite files. The replica is a
+    snapshot, so rows added to the primary afterwards show the lag."""
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+
+    async def create_schema():
+        engine = build_engine(f"sqlite+aiosqlite:///{primary}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create_schema())
+    add_user(primary, "replicated")
+
+    with sqlite3.connect(primary) as source, sqlite3.connect(replica) as target:
+        source.backup(target)
+
+    add_user(primary, "fresh")
+
+    monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{primary}")
+    monkeypatch.setattr(
+        settings,
+        "database_replica_urls",
+        [f"sqlite+aiosqlite:///file:{replica}?mode=ro&uri=true"],
+    )
+    return tmp_path
+
+
+def usernames(client):
+    return {user["username"] for user in client.get("/users").json()["items"]}
+
+
+def test_reads_go_to_replica_until_client_writes(replicated):
+    with TestClient(create_app()) as client:
+        assert usernames(client) == {"replicated"}
+
+        # A failed write changes nothing...
+        assert client.delete("/users/999").status_code == 404
+        assert usernames(client) == {"replicated"}
+
+        # ...a successful one pins this client to the primary for a while.
+        client.post("/auth/register", json=BOB)
+        assert usernames(client) == {"replicated", "fresh", "bob"}
+
+        database.recent_writers.clear()
+        assert usernames(client) == {"replicated"}
+
+
+def test_pins_follow_the_token_user(replicated):
+    with TestClient(create_app()) as client:
+        client.post("/auth/register", json=BOB)
+        token = client.post(
+            "/auth/login", data={"username": "bob", "password": "pw"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # Only bob stays pinned, not everyone behind the same address.
+        database.recent_writers.discard("addr:testclient")
+
+        assert (
+            client.post("/tasks", json={"title": "New"}, headers=headers).status_code
+            == 201
+        )
+        assert len(client.get("/tasks", headers=headers).json()["items"]) == 1
+        assert usernames(client) == {"replicated"}
+
+        database.recent_writers.clear()
+        assert client.get("/tasks", headers=headers).json()["items"] == []
+
+
+def test_cached_token_is_not_decoded_again(replicated, monkeypatch):
+    with TestClient(create_app()) as client:
+        client.post("/auth/register", json=BOB)
+        token = client.post(
+            "/auth/login", data={"username": "bob", "password": "pw"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/tasks", json={"title": "New"}, headers=headers)
+
+        def decode(*args, **kwargs):
+            raise AssertionError("token decoded again")
+
+        monkeypatch.setattr(database.jwt, "decode", decode)
+        assert len(client.get("/tasks", headers=headers).json()["items"]) == 1
+
+
+def test_unavailable_replica_falls_back_to_primary(replicated, monkeypatch):
+    missing = replicated / "missing.db"
+    monkeypatch.setattr(
+        settings,
+        "database_replica_urls",
+        [f"sqlite+aiosqlite:///file:{missing}?mode=ro&uri=true"],
+    )
+
+    with TestClient(create_app()) as client:
+        assert usernames(client) == {"replicated", "fresh"}
+        assert database.replicas[0].unavailable_until > 0
+
+
+def test_lagging_replica_falls_back_to_primary(replicated, monkeypatch):
+    monkeypatch.setattr(settings, "replica_lag_query", "SELECT 60")
+    monkeypatch.setattr(settings, "replica_max_lag_seconds", 5)
+
+    with TestClient(create_app()) as client:
+        assert usernames(client) == {"replicated", "fresh"}
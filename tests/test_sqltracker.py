@@ -0,0 +1,94 @@
+# tests/test_sqltracker.py
+import asyncio
+import logging
+import pytest
+from fastapi import status
+from sqlalchemy.exc import OperationalError
+from database import build_engine
+from sqltracker import QueryTracker, current_tracker
+from config import settings
+
+
+def test_debug_headers_report_queries(test_client, create_test_user, query_budget):
+    response = test_client.get(f"/users/{create_test_user['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-DB-Time"].endswith("ms")
+    query_budget(response, 1)
+
+
+def test_no_debug_headers_by_default(test_client, create_test_user):
+    response = test_client.get(f"/users/{create_test_user['id']}")
+    assert "X-DB-Queries" not in response.headers
+
+
+def test_task_routes_stay_within_budget(test_client, login_headers, query_budget):
+    headers = login_headers("carol")
+
+    for i in range(5):
+        response = test_client.post(
+            "/tasks", json={"title": f"Budget {i}"}, headers=headers
+        )
+    # user, insert, counter, refresh
+    query_budget(response, 4)
+
+    # Cached token: revision row + page, regardless of page size.
+    response = test_client.get("/tasks", headers=headers)
+    assert len(response.json()["items"]) == 5
+    query_budget(response, 2)
+
+    # Bulk writes are a fixed number of statements, whatever the item count.
+    response = test_client.post(
+        "/tasks/bulk", json=[{"title": f"Bulk {i}"} for i in range(50)], headers=headers
+    )
+    assert [item["task"]["title"] for item in response.json()] == [
+        f"Bulk {i}" for i in range(50)
+    ]
+    # user, counter, insert
+    query_budget(response, 3)
+
+    ids = [item["id"] for item in response.json()]
+    items = [
+        (
+            {"id": task_id, "title": "Renamed"}
+            if i % 2
+            else {"id": task_id, "is_completed": True}
+        )
+        for i, task_id in enumerate(ids)
+    ]
+    response = test_client.patch("/tasks/bulk", json=items, headers=headers)
+    assert all(item["status"] == 200 for item in response.json())
+    # user, owned tasks, counter, one executemany update
+    query_budget(response, 4)
+
+
+def test_repeated_statement_is_flagged(caplog):
+    tracker = QueryTracker(label="GET /tasks")
+
+    with caplog.at_level(logging.WARNING, logger="sqltracker"):
+        for _ in range(settings.repeated_query_threshold + 2):
+            tracker.record("SELECT tasks.id FROM tasks WHERE tasks.id = ?", 0.001)
+
+    warnings = [r for r in caplog.records if "N+1" in r.getMessage()]
+    assert len(warnings) == 1
+    assert "GET /tasks" in warnings[0].getMessage()
+
+
+def test_failed_statement_leaves_nothing_behind():
+    async def scenario():
+        engine = build_engine("sqlite+aiosqlite:///:memory:")
+        tracker = QueryTracker()
+        token = current_tracker.set(tracker)
+        try:
+            async with engine.connect() as conn:
+                with pytest.raises(OperationalError):
+                    await conn.exec_driver_sql("SELECT * FROM missing")
+                await conn.exec_driver_sql("SELECT 1")
+                leftovers = dict(conn.info)
+        finally:
+            current_tracker.reset(token)
+            await engine.dispose()
+        return tracker, leftovers
+
+    tracker, leftovers = asyncio.run(scenario())
+    assert tracker.queries == 1
+    assert "query_started" not in leftovers
@@ -1,6 +1,14 @@
 # tests/test_tasks.py
+import json
 import pytest
 from fastapi import status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from database import Base
+from manage import rebuild_task_counters
+import database
+import models
 
 
 @pytest.fixture
@@ -35,13 +43,78 @@ def test_list_tasks(test_client, auth_header):
     response = test_client.get("/tasks", headers=auth_header)
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
-    assert isinstance(data, list)
-    assert len(data) >= 1
+    assert isinstance(data["items"], list)
+    assert len(data["items"]) >= 1
+
+
+def test_list_tasks_pagination(test_client, auth_header):
+    for i in range(3):
+        test_client.post("/tasks", json={"title": f"Page {i}"}, headers=auth_header)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = test_client.get("/tasks", params=params, headers=auth_header)
+        assert response.status_code == status.HTTP_200_OK
+        page = response.json()
+        assert len(page["items"]) <= 2
+        seen.extend(task["id"] for task in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) >= 4
+    assert seen == sorted(seen)
+    assert len(set(seen)) == len(seen)
+
+
+def test_list_tasks_sparse_fields(test_client, auth_header):
+    full = test_client.get("/tasks", headers=auth_header)
+
+    response = test_client.get(
+        "/tasks", params={"fields": "title"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    items = response.json()["items"]
+    assert items == [
+        {"id": task["id"], "title": task["title"]} for task in full.json()["items"]
+    ]
+    assert response.headers["ETag"] != full.headers["ETag"]
+
+    response = test_client.get(
+        "/tasks", params={"fields": "title,secret"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def test_list_tasks_invalid_cursor(test_client, auth_header):
+    response = test_client.get(
+        "/tasks", params={"cursor": "not-a-cursor"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_list_tasks_etag(test_client, auth_header):
+    response = test_client.get("/tasks", headers=auth_header)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = test_client.get("/tasks", headers={**auth_header, "If-None-Match": etag})
+    assert cached.status_code == status.HTTP_304_NOT_MODIFIED
+    assert cached.headers["ETag"] == etag
+
+    test_client.post("/tasks", json={"title": "Fresh"}, headers=auth_header)
+    changed = test_client.get("/tasks", headers={**auth_header, "If-None-Match": etag})
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.headers["ETag"] != etag
 
 
 def test_update_task(test_client, auth_header):
     # Get task ID
-    tasks = test_client.get("/tasks", headers=auth_header).json()
+    tasks = test_client.get("/tasks", headers=auth_header).json()["items"]
     task_id = tasks[0]["id"]
 
     response = test_client.patch(
@@ -57,7 +130,7 @@ def test_update_task(test_client, auth_header):
 
 def test_delete_task(test_client, auth_header):
     # Get task ID
-    tasks = test_client.get("/tasks", headers=auth_header).json()
+    tasks = test_client.get("/tasks", headers=auth_header).json()["items"]
     task_id = tasks[0]["id"]
 
     response = test_client.delete(f"/tasks/{task_id}", headers=auth_header)
@@ -65,4 +138,263 @@ def test_delete_task(test_client, auth_header):
 
     # Task should no longer exist
     response = test_client.get("/tasks", headers=auth_header)
-    assert all(task["id"] != task_id for task in response.json())
+    assert all(task["id"] != task_id for task in response.json()["items"])
+
+
+def test_bulk_create_update_delete(test_client, auth_header):
+    response = test_client.post(
+        "/tasks/bulk",
+        json=[{"title": "Bulk 1"}, {"title": "Bulk 2"}, {"title": "Bulk 3"}],
+        headers=auth_header,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    created = response.json()
+    assert [item["task"]["title"] for item in created] == ["Bulk 1", "Bulk 2", "Bulk 3"]
+    ids = [item["id"] for item in created]
+
+    response = test_client.patch(
+        "/tasks/bulk",
+        json=[
+            {"id": ids[0], "is_completed": True},
+            {"id": ids[1], "title": "Bulk 2 renamed"},
+            {"id": 999_999, "title": "missing"},
+            {"id": ids[2], "title": None},
+            {"id": ids[2], "is_completed": None},
+        ],
+        headers=auth_header,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    updated = response.json()
+    # Explicit nulls fail only their own item.
+    assert [item["status"] for item in updated] == [200, 200, 404, 422, 422]
+    assert updated[3]["detail"] == "title cannot be null"
+    assert updated[0]["task"]["is_completed"] is True
+    assert updated[1]["task"]["title"] == "Bulk 2 renamed"
+
+    response = test_client.request(
+        "DELETE",
+        "/tasks/bulk",
+        json={"ids": [ids[2], 999_999]},
+        headers=auth_header,
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["status"] for item in response.json()] == [204, 404]
+
+    remaining = test_client.get("/tasks", headers=auth_header).json()["items"]
+    assert ids[2] not in {task["id"] for task in remaining}
+
+
+def test_bulk_rejects_other_users_tasks(test_client, auth_header, login_headers):
+    other_header = login_headers("mallory")
+
+    task_id = test_client.post(
+        "/tasks", json={"title": "Bob's"}, headers=auth_header
+    ).json()["id"]
+
+    response = test_client.patch(
+        "/tasks/bulk", json=[{"id": task_id, "title": "hijacked"}], headers=other_header
+    )
+    assert response.json()[0]["status"] == status.HTTP_404_NOT_FOUND
+
+
+def test_sharded_tasks_routed_by_user(test_client, auth_header, monkeypatch):
+    shard_engines = [
+        create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+        for _ in range(2)
+    ]
+    shard_sessions = [
+        async_sessionmaker(bind=shard_engine, expire_on_commit=False)
+        for shard_engine in shard_engines
+    ]
+
+    async def create_shard_tables():
+        for shard_engine in shard_engines:
+            async with shard_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+    async def task_owners(shard):
+        async with shard_sessions[shard]() as session:
+            result = await session.execute(select(models.Task.user_id))
+            return set(result.scalars())
+
+    test_client.portal.call(create_shard_tables)
+    monkeypatch.setattr(database, "shard_sessions", shard_sessions)
+
+    response = test_client.post(
+        "/tasks", json={"title": "Sharded"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    user_id = response.json()["user_id"]
+
+    home = database.shard_for(user_id, 2)
+    assert test_client.portal.call(task_owners, home) == {user_id}
+    assert test_client.portal.call(task_owners, 1 - home) == set()
+
+    items = test_client.get("/tasks", headers=auth_header).json()["items"]
+    assert [task["title"] for task in items] == ["Sharded"]
+
+    # Task counts for users are read from their shards.
+    users = test_client.get(
+        "/users/batch", params={"ids": user_id, "include": "task_counts"}
+    ).json()
+    assert users[0]["task_total"] == 1
+
+
+def test_export_tasks(test_client, auth_header):
+    test_client.post("/tasks", json={"title": "Export me"}, headers=auth_header)
+
+    response = test_client.get("/tasks/export", headers=auth_header)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert any(row["title"] == "Export me" for row in rows)
+
+    response = test_client.get(
+        "/tasks/export", params={"format": "csv"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_200_OK
+    lines = response.text.splitlines()
+    assert lines[0] == "id,title,is_completed,user_id"
+    assert len(lines) == len(rows) + 1
+
+
+def test_list_tasks_filters(test_client, auth_header):
+    created = test_client.post(
+        "/tasks/bulk",
+        json=[
+            {"title": "Buy milk"},
+            {"title": "Buy oat milk"},
+            {"title": "Call the plumber"},
+        ],
+        headers=auth_header,
+    ).json()
+    test_client.patch(
+        f"/tasks/{created[2]['id']}", json={"is_completed": True}, headers=auth_header
+    )
+
+    def titles(**params):
+        response = test_client.get(
+            "/tasks", params={"limit": 200, **params}, headers=auth_header
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return {task["title"] for task in response.json()["items"]}
+
+    assert titles(title_prefix="Buy") == {"Buy milk", "Buy oat milk"}
+    assert titles(q="milk") == {"Buy milk", "Buy oat milk"}
+    assert titles(q="oat milk") == {"Buy oat milk"}
+    assert "Call the plumber" in titles(is_completed=True)
+    assert "Call the plumber" not in titles(is_completed=False)
+
+    # Renames and deletes keep the full-text index in sync.
+    test_client.patch(
+        f"/tasks/{created[0]['id']}", json={"title": "Buy bread"}, headers=auth_header
+    )
+    test_client.delete(f"/tasks/{created[1]['id']}", headers=auth_header)
+    assert titles(q="milk") == set()
+    assert titles(q="bread") == {"Buy bread"}
+
+
+def test_task_stats_and_rebuild(test_client, auth_header):
+    def stats():
+        response = test_client.get("/tasks/stats", headers=auth_header)
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    before = stats()
+    created = test_client.post(
+        "/tasks/bulk", json=[{"title": "s1"}, {"title": "s2"}], headers=auth_header
+    ).json()
+    test_client.patch(
+        f"/tasks/{created[0]['id']}", json={"is_completed": True}, headers=auth_header
+    )
+    after = stats()
+    assert after["total"] == before["total"] + 2
+    assert after["completed"] == before["completed"] + 1
+    assert after["open"] == after["total"] - after["completed"]
+
+    test_client.delete(f"/tasks/{created[0]['id']}", headers=auth_header)
+    assert stats()["completed"] == before["completed"]
+
+    async def drift_and_rebuild():
+        async with database.SessionLocal() as db:
+            await db.execute(update(models.TaskCounter).values(total=999))
+            await db.commit()
+            await rebuild_task_counters(db)
+
+    test_client.portal.call(drift_and_rebuild)
+    assert stats()["total"] == before["total"] + 1
+
+
+def test_task_changes_delta_sync(test_client, auth_header, query_budget):
+    def changes(since=0, cursor=None, limit=50):
+        response = test_client.get(
+            "/tasks/changes",
+            params={"since": since, "cursor": cursor, "limit": limit},
+            headers=auth_header,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.json()
+
+    everything = changes(limit=200)
+    assert not everything["has_more"]
+    since = everything["version"]
+    assert {item["id"] for item in everything["items"] if not item["deleted"]} == {
+        task["id"]
+        for task in test_client.get(
+            "/tasks", params={"limit": 200}, headers=auth_header
+        ).json()["items"]
+    }
+
+    # Nothing changed: nothing to download.
+    response = test_client.get(
+        "/tasks/changes", params={"since": since}, headers=auth_header
+    )
+    assert response.json()["items"] == []
+    assert response.json()["version"] == since
+    assert not response.json()["has_more"]
+    query_budget(response, 2)
+
+    created = test_client.post(
+        "/tasks/bulk",
+        json=[{"title": "d1"}, {"title": "d2"}, {"title": "d3"}],
+        headers=auth_header,
+    ).json()
+    ids = [item["id"] for item in created]
+    test_client.patch(
+        f"/tasks/{ids[0]}", json={"is_completed": True}, headers=auth_header
+    )
+    test_client.delete(f"/tasks/{ids[1]}", headers=auth_header)
+
+    delta = changes(cursor=everything["cursor"])
+    assert [(item["id"], item["deleted"]) for item in delta["items"]] == [
+        (ids[2], False),
+        (ids[0], False),
+        (ids[1], True),
+    ]
+    assert delta["items"][1]["is_completed"] is True
+    assert delta["items"][2] == {
+        "id": ids[1],
+        "version": delta["version"],
+        "deleted": True,
+    }
+
+    assert changes(since)["items"] == delta["items"]
+
+    # Pages split on (version, id), so one write larger than the page (a bulk
+    # insert, or the migration's backfill) still pages normally.
+    more = test_client.post(
+        "/tasks/bulk", json=[{"title": "e1"}, {"title": "e2"}], headers=auth_header
+    ).json()
+    first = changes(cursor=delta["cursor"], limit=1)
+    assert first["has_more"]
+    assert [item["id"] for item in first["items"]] == [more[0]["id"]]
+    second = changes(cursor=first["cursor"], limit=1)
+    assert not second["has_more"]
+    assert [item["id"] for item in second["items"]] == [more[1]["id"]]
+    assert second["version"] == first["version"]
+    assert changes(cursor=second["cursor"], limit=1)["items"] == []
+
+    response = test_client.get(
+        "/tasks/changes", params={"cursor": "junk"}, headers=auth_header
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,13 +1,25 @@
 # tests/test_users.py
 from fastapi import status
+from sqlalchemy import delete, func, select, update
+from config import settings
+from purge import drain_purges, purge_deleted_users
+import database
+import models
 
 
 def test_list_users(test_client, create_test_user):
     response = test_client.get("/users")
     assert response.status_code == status.HTTP_200_OK
     data = response.json()
-    assert isinstance(data, list)
-    assert any(user["username"] == "alice" for user in data)
+    assert isinstance(data["items"], list)
+    assert any(user["username"] == "alice" for user in data["items"])
+
+
+def test_list_users_limit(test_client, create_test_user):
+    response = test_client.get("/users", params={"limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len(data["items"]) == 1
 
 
 def test_get_user_by_id(test_client, create_test_user):
@@ -18,6 +30,27 @@ def test_get_user_by_id(test_client, create_test_user):
     assert data["username"] == "alice"
 
 
+def test_get_user_by_id_etag(test_client, create_test_user):
+    url = f"/users/{create_test_user['id']}"
+    etag = test_client.get(url).headers["ETag"]
+
+    response = test_client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_users_sparse_fields(test_client, create_test_user):
+    alice_id = create_test_user["id"]
+
+    response = test_client.get(f"/users/{alice_id}", params={"fields": "username"})
+    assert response.json() == {"username": "alice", "id": alice_id}
+
+    items = test_client.get("/users", params={"fields": "email"}).json()["items"]
+    assert all(set(user) == {"email", "id"} for user in items)
+
+    response = test_client.get("/users", params={"fields": "password"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
 def test_get_nonexistent_user(test_client):
     response = test_client.get("/users/999")
     assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -41,3 +74,161 @@ def test_delete_user(test_client):
     # Check user deleted
     response = test_client.get(f"/users/{user_id}")
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_delete_user_revokes_cached_token(test_client):
+    response = test_client.post(
+        "/auth/register",
+        json={"username": "carol", "email": "carol@example.com", "password": "pw"},
+    )
+    user_id = response.json()["id"]
+    token = test_client.post(
+        "/auth/login", data={"username": "carol", "password": "pw"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert test_client.get("/tasks", headers=headers).status_code == 200
+    hits = test_client.get("/health/cache").json()["token_cache"]["hits"]
+    assert test_client.get("/tasks", headers=headers).status_code == 200
+    assert test_client.get("/health/cache").json()["token_cache"]["hits"] == hits + 1
+
+    test_client.delete(f"/users/{user_id}")
+    response = test_client.get("/tasks", headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_writes_recheck_user_deleted_elsewhere(test_client, login_headers):
+    headers = login_headers("dave")
+    task = test_client.post("/tasks", json={"title": "one"}, headers=headers).json()
+    user_id = task["user_id"]
+
+    # Deleted by another worker: this one's token cache still has the token.
+    async def delete_elsewhere():
+        async with database.SessionLocal() as db:
+            await db.execute(delete(models.User).where(models.User.id == user_id))
+            await db.commit()
+
+    test_client.portal.call(delete_elsewhere)
+
+    response = test_client.post("/tasks", json={"title": "x"}, headers=headers)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert test_client.get("/tasks", headers=headers).status_code == 401
+
+
+def register_with_tasks(test_client, login_headers, username, titles):
+    headers = login_headers(username)
+    tasks = [
+        test_client.post("/tasks", json={"title": title}, headers=headers).json()
+        for title in titles
+    ]
+    test_client.patch(
+        f"/tasks/{tasks[0]['id']}", json={"is_completed": True}, headers=headers
+    )
+    return tasks[0]["user_id"]
+
+
+def test_list_users_with_task_counts(
+    test_client, login_headers, create_test_user, query_budget
+):
+    user_id = register_with_tasks(test_client, login_headers, "erin", ["one", "two"])
+
+    response = test_client.get(
+        "/users", params={"include": "task_counts", "limit": 200}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    users = {user["id"]: user for user in response.json()["items"]}
+    assert users[user_id]["task_total"] == 2
+    assert users[user_id]["task_completed"] == 1
+    assert users[create_test_user["id"]]["task_total"] == 0
+    query_budget(response, 1)
+
+
+def test_get_users_batch(test_client, login_headers, create_test_user, query_budget):
+    user_id = register_with_tasks(test_client, login_headers, "frank", ["one"])
+    alice_id = create_test_user["id"]
+
+    response = test_client.get(
+        "/users/batch", params={"ids": f"{user_id},999,{alice_id},{user_id}"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [user["id"] for user in response.json()] == [user_id, alice_id]
+    query_budget(response, 1)
+
+    response = test_client.get(
+        "/users/batch",
+        params=[
+            ("ids", str(user_id)),
+            ("ids", str(alice_id)),
+            ("include", "task_counts"),
+        ],
+    )
+    assert [user["task_total"] for user in response.json()] == [1, 0]
+
+    response = test_client.get("/users/batch", params={"ids": "1,x"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+
+
+def count_rows(test_client, model, user_id):
+    async def count():
+        async with database.SessionLocal() as db:
+            result = await db.execute(
+                select(func.count()).select_from(model).where(model.user_id == user_id)
+            )
+            return result.scalar_one()
+
+    return test_client.portal.call(count)
+
+
+def test_delete_user_cascades_to_tasks(test_client, login_headers):
+    user_id = register_with_tasks(
+        test_client, login_headers, "gina", ["keep", "searchable"]
+    )
+    assert count_rows(test_client, models.Task, user_id) == 2
+
+    assert test_client.delete(f"/users/{user_id}").status_code == 204
+    assert count_rows(test_client, models.Task, user_id) == 0
+    assert count_rows(test_client, models.TaskCounter, user_id) == 0
+
+
+def test_delete_user_in_background(test_client, login_headers, monkeypatch):
+    monkeypatch.setattr(settings, "purge_chunk_size", 2)
+    user_id = register_with_tasks(
+        test_client, login_headers, "hank", [f"t{i}" for i in range(5)]
+    )
+
+    response = test_client.delete(f"/users/{user_id}", params={"background": True})
+    assert response.status_code == status.HTTP_202_ACCEPTED
+
+    # The purge runs outside the request; wait for it like shutdown does.
+    test_client.portal.call(drain_purges)
+    assert count_rows(test_client, models.Task, user_id) == 0
+    assert test_client.get(f"/users/{user_id}").status_code == 404
+    assert test_client.delete(f"/users/{user_id}").status_code == 404
+
+
+def test_soft_deleted_user_hidden_until_purged(test_client, login_headers):
+    user_id = register_with_tasks(test_client, login_headers, "ivy", ["one"])
+
+    async def soft_delete():
+        async with database.SessionLocal() as db:
+            await db.execute(
+                update(models.User)
+                .where(models.User.id == user_id)
+                .values(deleted_at=func.now())
+            )
+            await db.commit()
+
+    test_client.portal.call(soft_delete)
+
+    assert test_client.get(f"/users/{user_id}").status_code == 404
+    listed = test_client.get("/users", params={"limit": 200}).json()["items"]
+    assert user_id not in [user["id"] for user in listed]
+    response = test_client.post(
+        "/auth/login", data={"username": "ivy", "password": "pw"}
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    # What `manage.py purge-deleted-users` runs to finish interrupted purges.
+    purged = test_client.portal.call(purge_deleted_users)
+    assert purged == {user_id: 1}
+    assert count_rows(test_client, models.Task, user_id) == 0